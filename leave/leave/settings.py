@@ -46,6 +46,8 @@ MIDDLEWARE = [
     "django.middleware.common.CommonMiddleware",
     "django.middleware.csrf.CsrfViewMiddleware",
     "django.contrib.auth.middleware.AuthenticationMiddleware",
+    "tracking.audit.AuditActorMiddleware",
+    "tracking.profiling.ProfilingMiddleware",
     "django.contrib.messages.middleware.MessageMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
 ]
@@ -77,9 +79,19 @@ DATABASES = {
     "default": {
         "ENGINE": "django.db.backends.sqlite3",#//aila default use garako xu
         "NAME": BASE_DIR / "db.sqlite3",
-    }
+    },
+    # Point-in-time copy of "default" for reports and exports, replaced by the
+    # snapshot_reporting_db command (see tracking/reporting.py). Read-only.
+    "reporting": {
+        "ENGINE": "django.db.backends.sqlite3",
+        "NAME": BASE_DIR / "reporting.sqlite3",
+        "OPTIONS": {"init_command": "PRAGMA query_only = 1"},
+        "TEST": {"MIRROR": "default"},
+    },
 }
 
+DATABASE_ROUTERS = ["tracking.reporting.ReportingRouter"]
+
 
 # Password validation
 # https://docs.djangoproject.com/en/6.0/ref/settings/#auth-password-validators
@@ -117,4 +129,91 @@ USE_TZ = True
 
 STATIC_URL = "static/"
 
-AUTH_USER_MODEL = "tracking.CustomUser"
\ No newline at end of file
+AUTH_USER_MODEL = "tracking.CustomUser"
+
+# Throttling for login, signup and forgot_password (see tracking/throttling.py).
+# Rates are (capacity, tokens per second) per client IP and per username/email.
+# Set LEAVE_THROTTLE_CACHE to a CACHES alias to share buckets between workers.
+LEAVE_THROTTLE_ENABLED = True
+LEAVE_THROTTLE_CACHE = None
+LEAVE_THROTTLE_RATES = {
+    "login": {"ip": (20, 20 / 60), "username": (5, 5 / 300)},
+    "signup": {"ip": (5, 5 / 600), "username": (3, 3 / 600)},
+    "forgot_password": {"ip": (5, 5 / 600), "username": (3, 3 / 900)},
+}
+
+# Leave balances (see tracking/balances.py and the close_leave_year command).
+# Days granted per leave type each year, and how many unused days may be
+# carried into the next year.
+LEAVE_ENTITLEMENTS = {
+    "sick": 12,
+    "casual": 12,
+    "vacation": 15,
+    "emergency": 5,
+    "other": 0,
+}
+LEAVE_CARRY_OVER_LIMITS = {
+    "vacation": 5,
+    "casual": 2,
+}
+
+# Run tracking.warmup when a WSGI/ASGI worker starts so the first request
+# does not pay for template compilation, URL resolver setup and cache fills.
+# Templates stay compiled because Django uses the cached template loader
+# whenever TEMPLATES has no explicit "loaders" option.
+LEAVE_WARMUP_ON_STARTUP = True
+
+# iCalendar feeds of approved leave (see tracking/calendar_feeds.py). Feeds are
+# cached until a relevant request changes; the cache key carries a version
+# counter kept in the database, so every worker sees a change once it commits.
+# A shared cache only saves each worker rendering the feed again. Feed URLs
+# stop working after LEAVE_CALENDAR_TOKEN_MAX_AGE seconds (the profile page
+# always shows a fresh one), when the user resets them, or when the holder
+# leaves the department.
+LEAVE_CALENDAR_CACHE = "default"
+LEAVE_CALENDAR_TOKEN_MAX_AGE = 60 * 60 * 24 * 365
+LEAVE_CALENDAR_CACHE_TIMEOUT = 60 * 60
+LEAVE_CALENDAR_UID_DOMAIN = "leave-tracking"
+
+# Audit trail (see tracking/audit.py). Entries are buffered in memory and
+# written with bulk_create at transaction commit, or once this many entries
+# are waiting or the oldest is this many seconds old.
+LEAVE_AUDIT_BUFFER_SIZE = 50
+LEAVE_AUDIT_FLUSH_INTERVAL = 5.0
+
+# On-demand profiling (see tracking/profiling.py). An admin adds ?_profile=1
+# or an "X-Profile: 1" header; the cProfile output and SQL timings are kept in
+# a ring of the newest LEAVE_PROFILE_MAX_REPORTS reports.
+LEAVE_PROFILE_DIR = BASE_DIR / "profiles"
+LEAVE_PROFILE_MAX_REPORTS = 20
+
+# Render the row-heavy list fragments (tracking table, user cards, leave
+# history) with Jinja2 instead of the Django template language; needs the
+# jinja2 package. Pages keep their Django shell and pull the fragments in with
+# {% list_include %}; the Jinja2 twins live in tracking/jinja2/ and their
+# backend is built on first use (see tracking/templating.py and the
+# bench_templates command).
+LEAVE_JINJA2_TEMPLATES = False
+
+# Leave changes feed (see tracking/sync.py). Rows younger than the settle time
+# are held back so late commits are never skipped; tombstones of deleted
+# requests are kept this many days (prune_leave_tombstones), and a cursor older
+# than that has to start over with a full sync.
+LEAVE_SYNC_SETTLE_SECONDS = 5
+LEAVE_SYNC_TOMBSTONE_DAYS = 90
+
+# Reporting snapshot (see tracking/reporting.py). The read-only reports listed
+# here (admin home stats, the admins' all-requests history, the admin CSV
+# export) read from the LEAVE_REPORTING_DB alias while its snapshot is at most
+# LEAVE_REPORTING_MAX_AGE seconds old and has the live schema, and from the
+# live database otherwise; schedule "snapshot_reporting_db" (or run it with
+# --every) to keep it fresh. Pages that change what they show (tracking,
+# users) must stay on the live database.
+LEAVE_REPORTING_DB = "reporting"
+LEAVE_REPORTING_PAGES = ["home", "history", "export"]
+LEAVE_REPORTING_MAX_AGE = 3600
+
+# Django admin changelists count at most this many rows for filtered results
+# instead of running a full COUNT(*), and show "10000+" when the limit is
+# reached (see tracking/admin.py).
+LEAVE_ADMIN_COUNT_LIMIT = 10000
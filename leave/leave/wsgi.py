@@ -14,3 +14,11 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "leave.settings")
 
 application = get_wsgi_application()
+
+# Compile templates, build URL tables and prime caches before the first request
+from django.conf import settings  # noqa: E402
+
+if getattr(settings, "LEAVE_WARMUP_ON_STARTUP", False):
+    from tracking.warmup import run_warmup  # noqa: E402
+
+    run_warmup()
@@ -1,23 +1,185 @@
 # khora/admin.py
+import csv
+from itertools import chain
+
+from django.conf import settings
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin
-from .models import CustomUser, LeaveRequest
+from django.core.paginator import Paginator
+from django.db import connections
+from django.db.models import Q
+from django.db.models.functions import Lower
+from django.http import StreamingHttpResponse
+from django.db.models.expressions import RawSQL
+from django.utils.functional import cached_property
+from . import fts
+from .reporting import reporting_db, snapshot_age
+from .models import CustomUser, LeaveRequest, LeaveBalance, LeaveLedgerEntry, LeavePolicy, AuditLogEntry
+
+def estimate_row_count(model, using):
+    """Cheap table size estimate, or None when the backend has none"""
+    connection = connections[using]
+    table = model._meta.db_table
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            cursor.execute('SELECT reltuples::bigint FROM pg_class WHERE relname = %s', [table])
+            row = cursor.fetchone()
+            return row[0] if row and row[0] >= 0 else None
+        if connection.vendor == 'sqlite':
+            # Row count recorded by ANALYZE, otherwise the highest id
+            cursor.execute("SELECT name FROM sqlite_master WHERE name = 'sqlite_stat1'")
+            if cursor.fetchone():
+                cursor.execute('SELECT stat FROM sqlite_stat1 WHERE tbl = %s LIMIT 1', [table])
+                row = cursor.fetchone()
+                if row:
+                    return int(row[0].split()[0])
+            cursor.execute(f'SELECT MAX({model._meta.pk.column}) FROM {connection.ops.quote_name(table)}')
+            return cursor.fetchone()[0] or 0
+    return None
+
+class CappedCount(int):
+    """A row count that stopped at its limit; the admin shows it as 10000+"""
+    def __str__(self):
+        return f'{int(self)}+'
+
+class EstimatedCountPaginator(Paginator):
+    """Paginator that never runs an unbounded COUNT(*).
+    
+    Unfiltered changelists use the table size estimate; filtered ones count
+    at most LEAVE_ADMIN_COUNT_LIMIT rows, and a count that reaches the limit
+    is a CappedCount.
+    """
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        if not queryset.query.where:
+            estimate = estimate_row_count(queryset.model, queryset.db)
+            if estimate is not None:
+                return estimate
+        limit = getattr(settings, 'LEAVE_ADMIN_COUNT_LIMIT', 10000)
+        count = queryset.order_by()[:limit + 1].count()
+        return CappedCount(limit) if count > limit else count
 
 @admin.register(CustomUser)
 class CustomUserAdmin(UserAdmin):
-    list_display = ('username', 'email', 'role', 'department', 'is_staff')
+    list_display = ('username', 'email', 'role', 'department', 'manager', 'is_staff')
     list_filter = ('role', 'is_staff', 'is_active')
+    list_select_related = ('manager',)
+    autocomplete_fields = ('manager',)
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
     fieldsets = UserAdmin.fieldsets + (
-        ('Additional Info', {'fields': ('role', 'phone', 'department')}),
+        ('Additional Info', {'fields': ('role', 'phone', 'department', 'manager')}),
     )
     add_fieldsets = UserAdmin.add_fieldsets + (
-        ('Additional Info', {'fields': ('role', 'phone', 'department')}),
+        ('Additional Info', {'fields': ('role', 'phone', 'department', 'manager')}),
     )
 
+class DaysCountFilter(admin.SimpleListFilter):
+    """Leave length ranges, served by the index on the stored days_count column"""
+    title = 'length'
+    parameter_name = 'length'
+    RANGES = {
+        '1': (1, 1),
+        '2-5': (2, 5),
+        '6-10': (6, 10),
+        '11+': (11, None),
+    }
+    
+    def lookups(self, request, model_admin):
+        return [(key, f'{key} days' if key != '1' else '1 day') for key in self.RANGES]
+    
+    def queryset(self, request, queryset):
+        if self.value() not in self.RANGES:
+            return queryset
+        low, high = self.RANGES[self.value()]
+        queryset = queryset.filter(days_count__gte=low)
+        return queryset.filter(days_count__lte=high) if high else queryset
+
+class Echo:
+    """File-like object whose write() hands the line back, for streaming csv.writer output"""
+    def write(self, value):
+        return value
+
 @admin.register(LeaveRequest)
 class LeaveRequestAdmin(admin.ModelAdmin):
-    list_display = ('user', 'leave_type', 'start_date', 'end_date', 'status', 'submitted_on')
-    list_filter = ('status', 'leave_type', 'submitted_on')
+    list_display = ('user', 'leave_type', 'start_date', 'end_date', 'days_count', 'status', 'submitted_on')
+    list_filter = ('status', 'leave_type', DaysCountFilter, 'submitted_on')
+    list_select_related = ('user',)
     search_fields = ('user__username', 'reason')
-    date_hierarchy = 'submitted_on'
-    readonly_fields = ('submitted_on', 'updated_on')
\ No newline at end of file
+    search_help_text = 'Username prefix, or words from the reason'
+    readonly_fields = ('days_count', 'submitted_on', 'updated_on')
+    actions = ['export_csv']
+    EXPORT_FIELDS = ('id', 'user__username', 'user__department', 'leave_type', 'start_date', 'end_date',
+                     'days_count', 'status', 'submitted_on')
+    autocomplete_fields = ('user',)
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    
+    def get_search_results(self, request, queryset, search_term):
+        # Served by the LOWER(username) index (range scan for the prefix,
+        # case-insensitive) and the FTS5 index on reason, instead of
+        # LIKE '%term%' on both columns.
+        term = search_term.strip()
+        if not term or not fts.is_available(queryset.db):
+            return super().get_search_results(request, queryset, search_term)
+        prefix = term.lower()
+        user_ids = CustomUser.objects.annotate(username_lower=Lower('username')).filter(
+            username_lower__gte=prefix, username_lower__lt=prefix + '\U0010ffff',
+        ).values('id')
+        reason_ids = RawSQL(fts.matching_ids_sql(), [fts.match_query(term)])
+        return queryset.filter(Q(user__in=user_ids) | Q(id__in=reason_ids)), False
+    
+    @admin.action(description='Export selected leave requests as CSV')
+    def export_csv(self, request, queryset):
+        writer = csv.writer(Echo())
+        header = [field.replace('user__', '') for field in self.EXPORT_FIELDS]
+        # Large exports stream from the reporting snapshot when it is configured and fresh
+        db = reporting_db('export')
+        rows = queryset.using(db).order_by('id').values_list(*self.EXPORT_FIELDS).iterator(chunk_size=2000)
+        lines = (writer.writerow(row) for row in chain([header], rows))
+        response = StreamingHttpResponse(lines, content_type='text/csv')
+        response['Content-Disposition'] = 'attachment; filename="leave_requests.csv"'
+        if db != queryset.db:
+            response['X-Snapshot-Age'] = f'{snapshot_age():.0f}'
+        return response
+
+@admin.register(LeaveBalance)
+class LeaveBalanceAdmin(admin.ModelAdmin):
+    list_display = ('user', 'leave_type', 'year', 'entitled_days', 'carried_over_days', 'used_days', 'closed')
+    list_filter = ('year', 'leave_type', 'closed')
+    list_select_related = ('user',)
+    search_fields = ('user__username',)
+    raw_id_fields = ('user',)
+    readonly_fields = ('updated_on',)
+
+@admin.register(LeaveLedgerEntry)
+class LeaveLedgerEntryAdmin(admin.ModelAdmin):
+    list_display = ('user', 'leave_type', 'year', 'kind', 'days', 'note', 'created_on')
+    list_filter = ('year', 'kind', 'leave_type')
+    list_select_related = ('user',)
+    search_fields = ('user__username', 'note')
+    raw_id_fields = ('user',)
+
+@admin.register(LeavePolicy)
+class LeavePolicyAdmin(admin.ModelAdmin):
+    list_display = ('name', 'kind', 'leave_type', 'department', 'value', 'start_date', 'end_date', 'active')
+    list_filter = ('kind', 'leave_type', 'active')
+    list_editable = ('active',)
+    search_fields = ('name', 'department')
+
+@admin.register(AuditLogEntry)
+class AuditLogEntryAdmin(admin.ModelAdmin):
+    list_display = ('created_on', 'actor_username', 'action', 'model_name', 'object_id', 'object_repr')
+    list_filter = ('action', 'model_name')
+    search_fields = ('actor_username', 'object_id', 'object_repr')
+    
+    # The audit trail is append-only
+    def has_add_permission(self, request):
+        return False
+    
+    def has_change_permission(self, request, obj=None):
+        return False
+    
+    def has_delete_permission(self, request, obj=None):
+        return False
\ No newline at end of file
@@ -0,0 +1,134 @@
+# khora/audit.py
+import atexit
+import logging
+import threading
+import time
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import DatabaseError, connection, transaction
+
+from .models import AuditLogEntry, CustomUser, LeaveRequest
+
+logger = logging.getLogger(__name__)
+
+AUDIT_FIELDS = {
+    LeaveRequest: ('user_id', 'leave_type', 'start_date', 'end_date', 'reason', 'status', 'admin_comment'),
+    CustomUser: ('username', 'email', 'first_name', 'last_name', 'phone', 'department', 'manager_id', 'role',
+                 'is_active'),
+}
+
+_current_request = ContextVar('audit_request', default=None)
+
+
+class AuditActorMiddleware:
+    """Make the current request visible to audit signal handlers"""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        token = _current_request.set(request)
+        try:
+            return self.get_response(request)
+        finally:
+            _current_request.reset(token)
+
+
+def snapshot(instance):
+    return {field: instance.__dict__.get(field) for field in AUDIT_FIELDS[type(instance)]}
+
+
+def diff(before, after):
+    return {field: [before.get(field), value] for field, value in after.items() if before.get(field) != value}
+
+
+class AuditBuffer:
+    """Collects audit entries in memory and writes them with bulk_create.
+
+    Entries made inside a transaction join the buffer only when it commits,
+    and are flushed right away. Outside a transaction they are flushed once
+    the buffer holds ``max_size`` entries or the oldest is ``max_age`` seconds
+    old (a background timer covers quiet periods). Anything still buffered
+    is flushed at interpreter exit.
+    """
+
+    def __init__(self, max_size=50, max_age=5.0):
+        self.max_size = max_size
+        self.max_age = max_age
+        self._entries = []
+        self._oldest = None
+        self._timer = None
+        self._lock = threading.Lock()
+
+    def add(self, entry):
+        if connection.in_atomic_block:
+            transaction.on_commit(lambda: self._enqueue(entry, flush=True))
+        else:
+            self._enqueue(entry)
+
+    def _enqueue(self, entry, flush=False):
+        with self._lock:
+            self._entries.append(entry)
+            if self._oldest is None:
+                self._oldest = time.monotonic()
+            due = (flush or len(self._entries) >= self.max_size
+                   or time.monotonic() - self._oldest >= self.max_age)
+            if not due and self._timer is None:
+                self._timer = threading.Timer(self.max_age, self._flush_from_timer)
+                self._timer.daemon = True
+                self._timer.start()
+        if due:
+            self.flush()
+
+    def _flush_from_timer(self):
+        with self._lock:
+            self._timer = None
+        try:
+            self.flush()
+        finally:
+            connection.close()
+
+    def flush(self):
+        with self._lock:
+            entries, self._entries = self._entries, []
+            self._oldest = None
+        if not entries:
+            return 0
+        try:
+            AuditLogEntry.objects.bulk_create(entries, batch_size=500)
+        except DatabaseError:
+            logger.exception('Could not write %d audit entries; keeping them for the next flush', len(entries))
+            with self._lock:
+                # Bounded so a persistent error cannot grow the buffer forever
+                self._entries[:0] = entries[-self.max_size * 20:]
+                self._oldest = self._oldest or time.monotonic()
+            return 0
+        return len(entries)
+
+    def pending(self):
+        with self._lock:
+            return len(self._entries)
+
+
+audit_buffer = AuditBuffer(
+    max_size=getattr(settings, 'LEAVE_AUDIT_BUFFER_SIZE', 50),
+    max_age=getattr(settings, 'LEAVE_AUDIT_FLUSH_INTERVAL', 5.0),
+)
+atexit.register(audit_buffer.flush)
+
+
+def record(action, instance, changes, object_repr=None):
+    request = _current_request.get()
+    actor = getattr(request, 'user', None) if request is not None else None
+    if actor is not None and not actor.is_authenticated:
+        actor = None
+    audit_buffer.add(AuditLogEntry(
+        actor_id=actor.pk if actor else None,
+        actor_username=actor.username if actor else '',
+        action=action,
+        model_name=type(instance).__name__,
+        object_id=str(instance.pk),
+        object_repr=(object_repr or str(instance))[:200],
+        changes=changes,
+    ))
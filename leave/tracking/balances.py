@@ -0,0 +1,166 @@
+# khora/balances.py
+from collections import defaultdict
+from datetime import date
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Q, Sum
+from django.utils import timezone
+
+from .models import LeaveRequest, LeaveBalance, LeaveLedgerEntry
+
+
+def entitlement_for(leave_type):
+    return getattr(settings, 'LEAVE_ENTITLEMENTS', {}).get(leave_type, 0)
+
+
+def carry_over_limit(leave_type):
+    return getattr(settings, 'LEAVE_CARRY_OVER_LIMITS', {}).get(leave_type, 0)
+
+
+def days_in_year(start_date, end_date, year):
+    """Number of days of [start_date, end_date] falling inside ``year``"""
+    start = max(start_date, date(year, 1, 1))
+    end = min(end_date, date(year, 12, 31))
+    return max((end - start).days + 1, 0)
+
+
+def apply_usage(leave_request, sign):
+    """Add (sign=1) or remove (sign=-1) an approved request from the balances it spans"""
+    for year in range(leave_request.start_date.year, leave_request.end_date.year + 1):
+        days = days_in_year(leave_request.start_date, leave_request.end_date, year) * sign
+        with transaction.atomic():
+            balance, created = LeaveBalance.objects.get_or_create(
+                user_id=leave_request.user_id,
+                leave_type=leave_request.leave_type,
+                year=year,
+                defaults={'entitled_days': entitlement_for(leave_request.leave_type)},
+            )
+            if created and balance.entitled_days:
+                LeaveLedgerEntry.objects.create(
+                    user_id=balance.user_id, leave_type=balance.leave_type, year=year,
+                    kind='grant', days=balance.entitled_days,
+                )
+            LeaveBalance.objects.filter(pk=balance.pk).update(used_days=F('used_days') + days)
+            LeaveLedgerEntry.objects.create(
+                user_id=leave_request.user_id,
+                leave_type=leave_request.leave_type,
+                year=year,
+                kind='usage',
+                days=-days,
+                note=f'Leave request #{leave_request.pk}',
+            )
+
+
+def current_balances(user):
+    """This year's balance for every leave type; nothing is summed from requests here.
+
+    Rows only exist once a request was approved or the year was closed, so
+    types without one are filled in, unsaved, from LEAVE_ENTITLEMENTS.
+    """
+    year = timezone.localdate().year
+    stored = {balance.leave_type: balance for balance in LeaveBalance.objects.filter(user=user, year=year)}
+    balances = []
+    for leave_type, _ in LeaveRequest.LEAVE_TYPE_CHOICES:
+        balance = stored.get(leave_type)
+        if balance is None and entitlement_for(leave_type):
+            balance = LeaveBalance(user=user, leave_type=leave_type, year=year,
+                                   entitled_days=entitlement_for(leave_type))
+        if balance is not None:
+            balances.append(balance)
+    return balances
+
+
+def compute_used_days(user_ids, year):
+    """Approved days per (user_id, leave_type) within ``year`` for one chunk of users.
+
+    Runs inside close_leave_year's worker processes, so it returns plain
+    tuples rather than model instances.
+    """
+    used = defaultdict(int)
+    first_day, last_day = date(year, 1, 1), date(year, 12, 31)
+    approved = LeaveRequest.objects.filter(
+        user_id__in=user_ids,
+        status='approved',
+        start_date__lte=last_day,
+        end_date__gte=first_day,
+    )
+    # Requests inside the year are summed by the database from the stored
+    # days_count; only the few that cross a year boundary are clipped here.
+    inside = Q(start_date__gte=first_day, end_date__lte=last_day)
+    totals = approved.filter(inside).values('user_id', 'leave_type').annotate(days=Sum('days_count')).order_by()
+    for row in totals:
+        used[(row['user_id'], row['leave_type'])] += row['days']
+    crossing = approved.exclude(inside).values_list('user_id', 'leave_type', 'start_date', 'end_date')
+    for user_id, leave_type, start_date, end_date in crossing.iterator():
+        used[(user_id, leave_type)] += days_in_year(start_date, end_date, year)
+    return [(user_id, leave_type, days) for (user_id, leave_type), days in used.items()]
+
+
+def close_chunk(user_ids, year, used_rows):
+    """Write used days and carry-over for one chunk with bulk queries.
+
+    Only the closing year's used days are overwritten; next year's opening
+    balances keep the used days apply_usage may be adding concurrently. The
+    ledger gets a grant for every balance created here and an adjustment
+    wherever the recount changed used days, so it still sums to the balances.
+    Returns (balances written, total days carried over).
+    """
+    used = {(user_id, leave_type): days for user_id, leave_type, days in used_rows}
+    existing = {
+        (b.user_id, b.leave_type, b.year): b
+        for b in LeaveBalance.objects.filter(user_id__in=user_ids, year__in=[year, year + 1])
+    }
+    now = timezone.now()
+    to_create, closing_updates, opening_updates, ledger = [], [], [], []
+    carried_total = 0
+
+    for user_id in user_ids:
+        for leave_type, _ in LeaveRequest.LEAVE_TYPE_CHOICES:
+            closing = existing.get((user_id, leave_type, year))
+            if closing is None:
+                closing = LeaveBalance(user_id=user_id, leave_type=leave_type, year=year,
+                                       entitled_days=entitlement_for(leave_type))
+                to_create.append(closing)
+                if closing.entitled_days:
+                    ledger.append(LeaveLedgerEntry(user_id=user_id, leave_type=leave_type, year=year,
+                                                   kind='grant', days=closing.entitled_days, created_on=now))
+            else:
+                closing_updates.append(closing)
+            recounted = used.get((user_id, leave_type), 0)
+            if recounted != closing.used_days:
+                ledger.append(LeaveLedgerEntry(user_id=user_id, leave_type=leave_type, year=year,
+                                               kind='adjustment', days=closing.used_days - recounted,
+                                               note=f'Used days recounted when closing {year}', created_on=now))
+            closing.used_days = recounted
+            closing.closed = True
+            closing.updated_on = now
+
+            carry = max(0, min(closing.remaining_days, carry_over_limit(leave_type)))
+            carried_total += carry
+            opening = existing.get((user_id, leave_type, year + 1))
+            if opening is None:
+                opening = LeaveBalance(user_id=user_id, leave_type=leave_type, year=year + 1,
+                                       entitled_days=entitlement_for(leave_type))
+                to_create.append(opening)
+                if opening.entitled_days:
+                    ledger.append(LeaveLedgerEntry(user_id=user_id, leave_type=leave_type, year=year + 1,
+                                                   kind='grant', days=opening.entitled_days, created_on=now))
+            else:
+                opening_updates.append(opening)
+            opening.carried_over_days = carry
+            opening.updated_on = now
+            if carry:
+                ledger.append(LeaveLedgerEntry(user_id=user_id, leave_type=leave_type, year=year + 1,
+                                               kind='carry_over', days=carry, note=f'Carried over from {year}',
+                                               created_on=now))
+
+    with transaction.atomic():
+        # Re-running a close replaces its carry-over entries instead of stacking them
+        LeaveLedgerEntry.objects.filter(user_id__in=user_ids, year=year + 1, kind='carry_over').delete()
+        LeaveBalance.objects.bulk_create(to_create, batch_size=500)
+        LeaveBalance.objects.bulk_update(closing_updates, ['used_days', 'closed', 'updated_on'], batch_size=500)
+        LeaveBalance.objects.bulk_update(opening_updates, ['carried_over_days', 'updated_on'], batch_size=500)
+        LeaveLedgerEntry.objects.bulk_create(ledger, batch_size=500)
+
+    return len(to_create) + len(closing_updates) + len(opening_updates), carried_total
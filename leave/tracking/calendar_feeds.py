@@ -0,0 +1,167 @@
+# khora/calendar_feeds.py
+import hashlib
+import time
+from datetime import timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.core import signing
+from django.core.cache import caches
+from django.db import transaction
+from django.utils.crypto import constant_time_compare, get_random_string, salted_hmac
+
+from . import versions
+from .models import CustomUser, LeaveRequest
+
+FEED_SALT = 'tracking.calendar-feed'
+
+
+def token_max_age():
+    return getattr(settings, 'LEAVE_CALENDAR_TOKEN_MAX_AGE', None)
+
+
+def _secret_digest(secret):
+    return salted_hmac(FEED_SALT, secret).hexdigest()[:20]
+
+
+def rotate_feed_secret(user):
+    """Give ``user`` a new feed secret, revoking every feed URL issued so far"""
+    user.feed_secret = get_random_string(32)
+    # A plain UPDATE: the secret is not profile data for the audit trail or index
+    CustomUser.objects.filter(pk=user.pk).update(feed_secret=user.feed_secret)
+
+
+def feed_token(user, kind):
+    """Unguessable token for a feed URL; calendar clients cannot log in.
+
+    It names the holder and is bound to their feed secret, so rotating the
+    secret revokes it. A department token also names the department and stops
+    working once the holder leaves it.
+    """
+    if not user.feed_secret:
+        rotate_feed_secret(user)
+    value = user.pk if kind == 'user' else user.department
+    return signing.dumps([kind, user.pk, value, _secret_digest(user.feed_secret)], salt=FEED_SALT, compress=True)
+
+
+def read_feed_token(token):
+    """(kind, value) of the feed ``token`` may read; BadSignature when expired, revoked or stale"""
+    try:
+        kind, user_id, value, digest = signing.loads(token, salt=FEED_SALT, max_age=token_max_age())
+    except (TypeError, ValueError):
+        raise signing.BadSignature('Malformed feed token')
+    if kind not in ('user', 'department'):
+        raise signing.BadSignature('Unknown feed kind')
+    holder = CustomUser.objects.filter(pk=user_id, is_active=True).values('feed_secret', 'department').first()
+    if holder is None or not holder['feed_secret'] or not constant_time_compare(
+        digest, _secret_digest(holder['feed_secret'])
+    ):
+        raise signing.BadSignature('Revoked feed token')
+    if kind == 'user' and value != user_id:
+        raise signing.BadSignature('Malformed feed token')
+    if kind == 'department' and (not value or value != holder['department']):
+        raise signing.BadSignature('Holder is no longer in this department')
+    return kind, value
+
+
+def _cache():
+    return caches[getattr(settings, 'LEAVE_CALENDAR_CACHE', 'default')]
+
+
+def _version_name(kind, value):
+    digest = hashlib.md5(str(value).encode()).hexdigest()[:16]
+    return f'calendar-feed:{kind}:{digest}'
+
+
+def _cache_key(kind, value, version):
+    return f'{_version_name(kind, value)}:v{version}'
+
+
+def _escape(text):
+    return (text.replace('\\', '\\\\').replace(';', '\\;')
+            .replace(',', '\\,').replace('\n', '\\n').replace('\r', ''))
+
+
+def _fold(line):
+    """Fold a content line at 75 octets as RFC 5545 requires"""
+    encoded = line.encode('utf-8')
+    if len(encoded) <= 75:
+        return line
+    parts = []
+    while len(encoded) > 75:
+        cut = 75 if not parts else 74
+        while cut and (encoded[cut] & 0xC0) == 0x80:
+            cut -= 1
+        parts.append(encoded[:cut].decode('utf-8'))
+        encoded = encoded[cut:]
+    parts.append(encoded.decode('utf-8'))
+    return '\r\n '.join(parts)
+
+
+def render_feed(kind, value):
+    requests = LeaveRequest.objects.filter(status='approved')
+    if kind == 'user':
+        requests = requests.filter(user_id=value)
+        name = 'My approved leave'
+    else:
+        requests = requests.filter(user__department=value)
+        name = f'{value} - approved leave'
+
+    host = getattr(settings, 'LEAVE_CALENDAR_UID_DOMAIN', 'leave-tracking')
+    lines = [
+        'BEGIN:VCALENDAR',
+        'VERSION:2.0',
+        'PRODID:-//Leave Tracking//Leave Calendar//EN',
+        'CALSCALE:GREGORIAN',
+        'METHOD:PUBLISH',
+        f'X-WR-CALNAME:{_escape(name)}',
+    ]
+    # DTSTAMP comes from the row, so an unchanged feed renders byte-for-byte
+    # the same and keeps its ETag across cache expiry.
+    for row in requests.rows('updated_on'):
+        summary = f"{row['username']} - {row['leave_type_label']}"
+        lines += [
+            'BEGIN:VEVENT',
+            f"UID:leave-{row['id']}@{host}",
+            f"DTSTAMP:{row['updated_on'].astimezone(dt_timezone.utc):%Y%m%dT%H%M%SZ}",
+            f"DTSTART;VALUE=DATE:{row['start_date']:%Y%m%d}",
+            f"DTEND;VALUE=DATE:{row['end_date'] + timedelta(days=1):%Y%m%d}",
+            f'SUMMARY:{_escape(summary)}',
+            'TRANSP:OPAQUE',
+            'END:VEVENT',
+        ]
+    lines.append('END:VCALENDAR')
+    return '\r\n'.join(_fold(line) for line in lines) + '\r\n'
+
+
+def get_feed(kind, value):
+    """Cached feed as a dict with ``body``, ``etag`` and ``last_modified``.
+
+    The cache key carries the feed's version counter (tracking/versions.py),
+    which moves once a relevant change commits (see tracking/signals.py), so
+    no worker serves a stale feed whichever cache holds it.
+    """
+    key = _cache_key(kind, value, versions.current(_version_name(kind, value)))
+    feed = _cache().get(key)
+    if feed is None:
+        body = render_feed(kind, value)
+        feed = {
+            'body': body,
+            'etag': '"%s"' % hashlib.md5(body.encode()).hexdigest(),
+            'last_modified': int(time.time()),
+        }
+        _cache().set(key, feed, getattr(settings, 'LEAVE_CALENDAR_CACHE_TIMEOUT', 3600))
+    return feed
+
+
+def invalidate_feeds(user_id=None, departments=()):
+    """Move the affected feeds to a new version once the transaction commits"""
+    names = {_version_name('department', department) for department in departments if department}
+    if user_id is not None:
+        names.add(_version_name('user', user_id))
+
+    def bump():
+        for name in sorted(names):
+            versions.bump(name)
+
+    if names:
+        transaction.on_commit(bump)
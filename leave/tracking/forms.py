@@ -1,7 +1,9 @@
 # khora/forms.py
 from django import forms
 from django.contrib.auth.forms import UserCreationForm, PasswordResetForm
+from django.utils import timezone
 from .models import CustomUser, LeaveRequest
+from .policies import Candidate, evaluate
 
 class SignUpForm(UserCreationForm):
     email = forms.EmailField(required=True, widget=forms.EmailInput(attrs={'class': 'form-input', 'placeholder': 'Email'}))
@@ -31,6 +33,10 @@ class LeaveRequestForm(forms.ModelForm):
             'reason': forms.Textarea(attrs={'class': 'form-input', 'rows': 4, 'placeholder': 'Enter reason for leave'}),
         }
     
+    def __init__(self, *args, user=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.user = user
+    
     def clean(self):
         cleaned_data = super().clean()
         start_date = cleaned_data.get('start_date')
@@ -39,6 +45,21 @@ class LeaveRequestForm(forms.ModelForm):
         if start_date and end_date and start_date > end_date:
             raise forms.ValidationError("End date must be after start date")
         
+        # Leave policies (see tracking/policies.py), compiled once and cached
+        if start_date and end_date and self.user is not None:
+            # Notice runs from the original submission, as in check_pending
+            if self.instance.pk:
+                notice_from = timezone.localdate(self.instance.submitted_on)
+            else:
+                notice_from = timezone.localdate()
+            candidate = Candidate(
+                self.instance.pk, self.user.pk, self.user.department, cleaned_data.get('leave_type'),
+                start_date, end_date, notice_from,
+            )
+            violations = evaluate(candidate)
+            if violations:
+                raise forms.ValidationError(violations)
+        
         return cleaned_data
 
 class LeaveApprovalForm(forms.ModelForm):
@@ -0,0 +1,61 @@
+# khora/fts.py
+from django.db import connections
+
+# External-content FTS5 index over LeaveRequest.reason, kept in sync by triggers.
+# It is (re)installed after every migrate because SQLite table rebuilds done by
+# the schema editor drop the triggers of the old table.
+TABLE = 'tracking_leaverequest'
+FTS_TABLE = 'tracking_leaverequest_fts'
+
+TRIGGERS = {
+    f'{FTS_TABLE}_ai': f"""
+        CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ai AFTER INSERT ON {TABLE} BEGIN
+            INSERT INTO {FTS_TABLE}(rowid, reason) VALUES (new.id, new.reason);
+        END""",
+    f'{FTS_TABLE}_ad': f"""
+        CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ad AFTER DELETE ON {TABLE} BEGIN
+            INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, reason) VALUES ('delete', old.id, old.reason);
+        END""",
+    f'{FTS_TABLE}_au': f"""
+        CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_au AFTER UPDATE OF reason ON {TABLE} BEGIN
+            INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, reason) VALUES ('delete', old.id, old.reason);
+            INSERT INTO {FTS_TABLE}(rowid, reason) VALUES (new.id, new.reason);
+        END""",
+}
+
+
+def is_available(using='default'):
+    return connections[using].vendor == 'sqlite'
+
+
+def ensure_reason_index(using='default'):
+    """Create the FTS table and triggers if missing; rebuild when anything was missing"""
+    connection = connections[using]
+    if connection.vendor != 'sqlite':
+        return False
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT name FROM sqlite_master WHERE type IN ('table', 'trigger')")
+        existing = {row[0] for row in cursor.fetchall()}
+        if TABLE not in existing:
+            return False
+        missing = FTS_TABLE not in existing or any(name not in existing for name in TRIGGERS)
+        if not missing:
+            return False
+        cursor.execute(
+            f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} "
+            f"USING fts5(reason, content='{TABLE}', content_rowid='id')"
+        )
+        for sql in TRIGGERS.values():
+            cursor.execute(sql)
+        cursor.execute(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')")
+    return True
+
+
+def match_query(term):
+    """FTS5 query matching every word of ``term`` as a prefix"""
+    words = [word.replace('"', '""') for word in term.split()]
+    return ' '.join(f'"{word}"*' for word in words)
+
+
+def matching_ids_sql():
+    return f'SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s'
@@ -0,0 +1,87 @@
+# khora/hierarchy.py
+from django.db import transaction
+
+from .models import CustomUser, ReportingLine
+
+# Roles allowed on the review pages; admins see everyone, managers their subtree
+REVIEWER_ROLES = ('admin', 'manager')
+
+
+def can_review(user):
+    return user.role in REVIEWER_ROLES
+
+
+def employees(queryset):
+    """Users who take leave: plain users and managers, i.e. everyone but admins"""
+    return queryset.exclude(role='admin')
+
+
+def scope_requests(queryset, user):
+    """Leave requests ``user`` may review: all for admins, the reporting subtree for managers.
+
+    The subtree is one join against the closure table's (ancestor, descendant)
+    unique index, whatever the depth of the tree.
+    """
+    if user.role == 'admin':
+        return queryset
+    return queryset.filter(user__reporting_ancestors__ancestor=user)
+
+
+def scope_users(queryset, user):
+    if user.role == 'admin':
+        return queryset
+    return queryset.filter(reporting_ancestors__ancestor=user)
+
+
+def ancestors(user_id):
+    """{ancestor_id: depth} for everyone above ``user_id``"""
+    return dict(ReportingLine.objects.filter(descendant_id=user_id).values_list('ancestor_id', 'depth'))
+
+
+def subtree(user_id):
+    """{descendant_id: depth} for ``user_id`` and everyone below, the user at depth 0"""
+    nodes = dict(ReportingLine.objects.filter(ancestor_id=user_id).values_list('descendant_id', 'depth'))
+    nodes[user_id] = 0
+    return nodes
+
+
+def move(user_id, manager_id):
+    """Re-hang ``user_id`` and its whole subtree under ``manager_id`` (None detaches it).
+
+    Rows inside the subtree are untouched; only the links from the old
+    ancestors are replaced by links from the new ones.
+    """
+    with transaction.atomic():
+        nodes = subtree(user_id)
+        ReportingLine.objects.filter(
+            descendant_id__in=list(nodes),
+            ancestor_id__in=list(ancestors(user_id)),
+        ).delete()
+        if manager_id is None:
+            return
+        above = ancestors(manager_id)
+        above[manager_id] = 0
+        if user_id in above:
+            raise ValueError(f'User {manager_id} is in the reporting tree of user {user_id}')
+        ReportingLine.objects.bulk_create([
+            ReportingLine(ancestor_id=ancestor_id, descendant_id=descendant_id, depth=up + down + 1)
+            for ancestor_id, up in above.items()
+            for descendant_id, down in nodes.items()
+        ], batch_size=1000)
+
+
+def rebuild():
+    """Regenerate the whole closure table from CustomUser.manager"""
+    managers = dict(CustomUser.objects.filter(manager__isnull=False).values_list('id', 'manager_id'))
+    rows = []
+    for user_id in managers:
+        seen = {user_id}
+        depth, current = 1, managers[user_id]
+        while current is not None and current not in seen:
+            rows.append(ReportingLine(ancestor_id=current, descendant_id=user_id, depth=depth))
+            seen.add(current)
+            depth, current = depth + 1, managers.get(current)
+    with transaction.atomic():
+        ReportingLine.objects.all().delete()
+        ReportingLine.objects.bulk_create(rows, batch_size=1000)
+    return len(rows)
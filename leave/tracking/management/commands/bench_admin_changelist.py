@@ -0,0 +1,115 @@
+import random
+import statistics
+import time
+from datetime import date, timedelta
+
+from django.contrib import admin
+from django.contrib.admin.views.main import PAGE_VAR
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test import RequestFactory
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from tracking.models import CustomUser, LeaveRequest
+
+REASONS = [
+    'Family wedding out of town', 'Flu and fever', 'Doctor appointment', 'Moving house',
+    'Child school event', 'Annual vacation with family', 'Personal errands', 'Dental surgery',
+]
+
+
+class BaselineLeaveRequestAdmin(admin.ModelAdmin):
+    """LeaveRequestAdmin as it was before the changelist tuning, for comparison"""
+    list_display = ('user', 'leave_type', 'start_date', 'end_date', 'status', 'submitted_on')
+    list_filter = ('status', 'leave_type', 'submitted_on')
+    search_fields = ('user__username', 'reason')
+    date_hierarchy = 'submitted_on'
+
+
+class Command(BaseCommand):
+    help = 'Benchmark the LeaveRequest admin changelist against the untuned baseline'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--seed', action='store_true', help='Insert synthetic users and requests first')
+        parser.add_argument('--rows', type=int, help='Leave requests to insert with --seed', default=1000000)
+        parser.add_argument('--users', type=int, help='Users to insert with --seed', default=10000)
+        parser.add_argument('--repeat', type=int, help='Runs per scenario (median is reported)', default=3)
+
+    def seed(self, rows, users):
+        self.stdout.write(f'Seeding {users} users and {rows} leave requests...')
+        start = CustomUser.objects.count()
+        with transaction.atomic():
+            CustomUser.objects.bulk_create(
+                [CustomUser(username=f'bench{start + i}', email=f'bench{start + i}@example.com',
+                            department=random.choice(['Ops', 'HR', 'Finance', 'IT']), password='!')
+                 for i in range(users)],
+                batch_size=1000,
+            )
+        user_ids = list(CustomUser.objects.values_list('id', flat=True))
+        leave_types = [choice for choice, _ in LeaveRequest.LEAVE_TYPE_CHOICES]
+        statuses = ['approved'] * 6 + ['rejected'] * 2 + ['pending']
+        now = timezone.now()
+        batch = []
+        for i in range(rows):
+            start_date = date(2020, 1, 1) + timedelta(days=random.randrange(2500))
+            batch.append(LeaveRequest(
+                user_id=random.choice(user_ids),
+                leave_type=random.choice(leave_types),
+                start_date=start_date,
+                end_date=start_date + timedelta(days=random.randrange(10)),
+                reason=random.choice(REASONS),
+                status=random.choice(statuses),
+                submitted_on=now - timedelta(minutes=rows - i),
+            ))
+            if len(batch) == 20000:
+                with transaction.atomic():
+                    LeaveRequest.objects.bulk_create(batch)
+                batch = []
+        if batch:
+            with transaction.atomic():
+                LeaveRequest.objects.bulk_create(batch)
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+
+    def run_changelist(self, model_admin, user, params):
+        request = RequestFactory().get('/admin/tracking/leaverequest/', params)
+        request.user = user
+        connection.queries_log.clear()
+        with CaptureQueriesContext(connection) as queries:
+            started = time.perf_counter()
+            response = model_admin.changelist_view(request)
+            response.render()
+            elapsed = time.perf_counter() - started
+        return elapsed * 1000, len(queries), response.status_code
+
+    def handle(self, *args, **options):
+        if options['seed']:
+            self.seed(options['rows'], options['users'])
+
+        user = CustomUser.objects.filter(is_superuser=True, is_active=True).first()
+        if user is None:
+            self.stdout.write(self.style.ERROR('Create a superuser first (e.g. manage.py create_admin)'))
+            return
+
+        admins = {
+            'baseline': BaselineLeaveRequestAdmin(LeaveRequest, admin.site),
+            'tuned': admin.site._registry[LeaveRequest],
+        }
+        scenarios = [
+            ('first page', {}),
+            ('page 500', {PAGE_VAR: '500'}),
+            ('status=pending', {'status__exact': 'pending'}),
+            ('search username', {'q': 'bench12'}),
+            ('search reason', {'q': 'dental'}),
+        ]
+        self.stdout.write(f'{LeaveRequest.objects.count()} leave requests, '
+                          f'{CustomUser.objects.count()} users\n')
+        self.stdout.write(f'{"scenario":<18}{"baseline ms":>14}{"queries":>9}{"tuned ms":>12}{"queries":>9}')
+        for name, params in scenarios:
+            line = f'{name:<18}'
+            for key in ('baseline', 'tuned'):
+                runs = [self.run_changelist(admins[key], user, params) for _ in range(options['repeat'])]
+                median = statistics.median(run[0] for run in runs)
+                line += f'{median:>14.1f}{runs[-1][1]:>9}'
+            self.stdout.write(line)
@@ -0,0 +1,108 @@
+import random
+import re
+import statistics
+import time
+from datetime import date, timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.template import engines
+from django.test import RequestFactory
+from django.utils import timezone
+
+from tracking.models import CustomUser, LeaveRequest
+from tracking.templating import jinja2_engine
+
+TEMPLATES = (
+    'admin/partials/tracking_results.html',
+    'admin/partials/user_cards.html',
+    'partials/leave_history_list.html',
+)
+
+
+class Command(BaseCommand):
+    help = 'Compare Django and Jinja2 render times of the list templates at several row counts'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, nargs='+', help='Row counts to render', default=[1000, 10000, 50000])
+        parser.add_argument('--repeat', type=int, help='Renders per engine (median is reported)', default=3)
+
+    def jinja2_engine(self):
+        # The list engine's Jinja2 backend, whether or not LEAVE_JINJA2_TEMPLATES is on
+        try:
+            return jinja2_engine()
+        except ImportError:
+            raise CommandError('Install jinja2 (requirements.txt) to run this benchmark')
+
+    def leave_rows(self, count):
+        leave_types = dict(LeaveRequest.LEAVE_TYPE_CHOICES)
+        statuses = dict(LeaveRequest.STATUS_CHOICES)
+        now = timezone.now()
+        rows = []
+        for i in range(count):
+            start_date = date(2026, 1, 1) + timedelta(days=random.randrange(365))
+            end_date = start_date + timedelta(days=random.randrange(10))
+            leave_type = random.choice(list(leave_types))
+            status = random.choice(list(statuses))
+            rows.append({
+                'id': i + 1, 'leave_type': leave_type, 'start_date': start_date, 'end_date': end_date,
+                'days_count': (end_date - start_date).days + 1, 'status': status,
+                'submitted_on': now - timedelta(hours=i), 'updated_on': now - timedelta(minutes=i),
+                'reason': 'Family wedding out of town', 'admin_comment': 'Enjoy' if i % 3 else '',
+                'username': f'user{i % 500}', 'department': random.choice(['Ops', 'HR', '']),
+                'leave_type_label': leave_types[leave_type], 'status_label': statuses[status],
+            })
+        return rows
+
+    def users(self, count):
+        now = timezone.now()
+        return [
+            CustomUser(
+                id=i + 1, username=f'user{i}', email=f'user{i}@example.com', department='Ops' if i % 2 else '',
+                role='admin' if i % 50 == 0 else 'user', is_active=bool(i % 7), date_joined=now,
+            )
+            for i in range(count)
+        ]
+
+    def context(self, name, count):
+        if name == 'admin/partials/user_cards.html':
+            users = self.users(count)
+            for i, user in enumerate(users):
+                user.total_requests, user.pending_requests = i % 9, i % 3
+                user.approved_requests, user.days_taken = i % 5, i % 40
+            return {'users': users}
+        return {'leave_requests': self.leave_rows(count)}
+
+    def time_render(self, template, context, request, repeat):
+        timings = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            output = template.render(context, request)
+            timings.append((time.perf_counter() - started) * 1000)
+        return statistics.median(timings), output
+
+    def handle(self, *args, **options):
+        django_engine = engines['django']
+        jinja2_engine = self.jinja2_engine()
+        admin = CustomUser(id=0, username='bench-admin', role='admin')
+        request = RequestFactory().get('/')
+        request.user = admin
+
+        self.stdout.write(f'{"template":<40}{"rows":>8}{"django ms":>12}{"jinja2 ms":>12}{"speedup":>9}  output')
+        for name in TEMPLATES:
+            django_template = django_engine.get_template(name)
+            jinja2_template = jinja2_engine.get_template(name)
+            for count in options['rows']:
+                context = self.context(name, count)
+                context['user'] = admin
+                django_ms, django_out = self.time_render(django_template, context, request, options['repeat'])
+                jinja2_ms, jinja2_out = self.time_render(jinja2_template, context, request, options['repeat'])
+                # csrf tokens differ per render; whitespace differs by engine
+                same = self.normalize(django_out) == self.normalize(jinja2_out)
+                self.stdout.write(f'{name:<40}{count:>8}{django_ms:>12.1f}{jinja2_ms:>12.1f}'
+                                  f'{django_ms / jinja2_ms:>8.1f}x  {"same" if same else "DIFFERS"}')
+
+    def normalize(self, html):
+        html = re.sub(r'name="csrfmiddlewaretoken" value="[^"]*"', '', html)
+        # markupsafe escapes quotes as &#34; and &#39;, Django as &quot; and &#x27;
+        html = html.replace('&#34;', '&quot;').replace('&#39;', '&#x27;')
+        return re.sub(r'\s+', ' ', html).strip()
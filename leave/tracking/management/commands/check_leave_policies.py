@@ -0,0 +1,33 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from tracking.models import LeaveRequest
+from tracking.policies import check_pending
+
+
+class Command(BaseCommand):
+    help = 'Re-check every pending leave request against the active leave policies'
+
+    def handle(self, *args, **options):
+        with CaptureQueriesContext(connection) as queries:
+            started = time.perf_counter()
+            violations = check_pending()
+            elapsed = time.perf_counter() - started
+
+        if violations:
+            requests = LeaveRequest.objects.select_related('user').in_bulk(list(violations))
+            for request_id, messages in sorted(violations.items()):
+                leave_request = requests[request_id]
+                self.stdout.write(f'#{request_id} {leave_request.user.username} '
+                                  f'{leave_request.start_date} to {leave_request.end_date}')
+                for message in messages:
+                    self.stdout.write(f'    {message}')
+
+        pending = LeaveRequest.objects.filter(status='pending').count()
+        self.stdout.write(self.style.SUCCESS(
+            f'Checked {pending} pending requests in {elapsed * 1000:.1f} ms with {len(queries)} queries: '
+            f'{len(violations)} break a policy'
+        ))
@@ -0,0 +1,66 @@
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+
+import django
+from django.core.management.base import BaseCommand
+from django.db import connections
+from django.utils import timezone
+
+from tracking.balances import compute_used_days, close_chunk
+from tracking.hierarchy import employees
+from tracking.models import CustomUser
+
+
+def _init_worker():
+    # Forked workers must not reuse the parent's database connection
+    django.setup()
+    connections.close_all()
+
+
+class Command(BaseCommand):
+    help = 'Close a leave year: compute used days and carry-over for every user'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--year', type=int, help='Leave year to close (default: last year)',
+                            default=timezone.localdate().year - 1)
+        parser.add_argument('--workers', type=int, help='Worker processes for computing used days',
+                            default=os.cpu_count() or 1)
+        parser.add_argument('--chunk-size', type=int, help='Users per chunk', default=500)
+
+    def handle(self, *args, **options):
+        year = options['year']
+        workers = max(1, options['workers'])
+        chunk_size = max(1, options['chunk_size'])
+        started = time.perf_counter()
+
+        user_ids = list(employees(CustomUser.objects.all()).order_by('id').values_list('id', flat=True))
+        chunks = [user_ids[i:i + chunk_size] for i in range(0, len(user_ids), chunk_size)]
+        self.stdout.write(f'Closing {year} for {len(user_ids)} users in {len(chunks)} chunks ({workers} workers)')
+
+        # Workers only read; every write happens here in bulk, one transaction
+        # per chunk, so SQLite never sees competing writers.
+        written = carried = 0
+        if workers == 1 or len(chunks) <= 1:
+            results = map(compute_used_days, chunks, repeat(year))
+            for chunk, used_rows in zip(chunks, results):
+                chunk_written, chunk_carried = close_chunk(chunk, year, used_rows)
+                written += chunk_written
+                carried += chunk_carried
+        else:
+            connections.close_all()
+            with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as pool:
+                results = pool.map(compute_used_days, chunks, repeat(year))
+                for chunk, used_rows in zip(chunks, results):
+                    chunk_written, chunk_carried = close_chunk(chunk, year, used_rows)
+                    written += chunk_written
+                    carried += chunk_carried
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'Closed leave year {year}: {written} balances written, '
+                f'{carried} days carried into {year + 1} '
+                f'({time.perf_counter() - started:.1f}s)'
+            )
+        )
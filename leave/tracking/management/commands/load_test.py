@@ -0,0 +1,359 @@
+import http.client
+import importlib.util
+import multiprocessing
+import os
+import random
+import re
+import socket
+import statistics
+import subprocess
+import sys
+import threading
+import time
+from collections import Counter, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from http.cookies import SimpleCookie
+from urllib.parse import urlencode, urlsplit
+
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.core.servers.basehttp import ThreadedWSGIServer, WSGIRequestHandler, get_internal_wsgi_application
+from django.db import connections, transaction
+from django.db.models import Q
+from django.urls import reverse
+from django.utils import timezone
+
+from tracking.models import CustomUser, LeaveRequest
+
+PASSWORD = 'load-test-password'
+EMPLOYEE_PREFIX = 'loadtest-user-'
+REVIEWER_PREFIX = 'loadtest-admin-'
+# Marks the accounts this command created; nothing else is ever changed,
+# reviewed or deleted, even if its username has a load-test prefix
+EMAIL_DOMAIN = '@load-test.invalid'
+CSRF_RE = re.compile(r'name="csrfmiddlewaretoken" value="([^"]+)"')
+UPDATE_RE = re.compile(r'/leave/update/(\d+)/')
+SEARCHES = ['loadtest', 'family', 'doctor', 'vacation', 'sick', 'wedding']
+REASONS = ['Family wedding out of town', 'Doctor appointment', 'Annual vacation with family', 'Sick day']
+
+
+class QuietRequestHandler(WSGIRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+
+def serve_builtin(listener, quiet):
+    """One pre-forked worker: a threaded WSGI server on the shared listening socket"""
+    # The views print debug lines and failing requests log tracebacks; keep
+    # them out of the report unless asked for
+    if quiet:
+        devnull = os.open(os.devnull, os.O_WRONLY)
+        os.dup2(devnull, sys.stdout.fileno())
+        os.dup2(devnull, sys.stderr.fileno())
+    connections.close_all()
+    host, port = listener.getsockname()[:2]
+    server = ThreadedWSGIServer((host, port), QuietRequestHandler, bind_and_activate=False)
+    server.socket.close()
+    server.socket = listener
+    server.server_name, server.server_port = host, port
+    server.setup_environ()
+    server.set_app(get_internal_wsgi_application())
+    server.serve_forever()
+
+
+def free_port(host):
+    with socket.socket() as probe:
+        probe.bind((host, 0))
+        return probe.getsockname()[1]
+
+
+def is_alive(process):
+    """Liveness of a forked worker (multiprocessing) or a server subprocess (Popen)"""
+    return process.is_alive() if hasattr(process, 'is_alive') else process.poll() is None
+
+
+def stop(process):
+    process.terminate()
+    if hasattr(process, 'join'):
+        process.join()
+    else:
+        process.wait()
+
+
+class Stats:
+    """Latencies and failures per endpoint, shared by every session thread"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.latencies = defaultdict(list)
+        self.failures = defaultdict(Counter)
+
+    def record(self, name, seconds, failure=None):
+        with self.lock:
+            self.latencies[name].append(seconds)
+            if failure is not None:
+                self.failures[name][failure] += 1
+
+
+class Session:
+    """One browser: a keep-alive connection and its cookies"""
+
+    def __init__(self, host, port, stats, source_address=None):
+        self.connection = http.client.HTTPConnection(host, port, timeout=60, source_address=source_address)
+        self.cookies = {}
+        self.stats = stats
+
+    def request(self, name, method, path, fields=None, expect=200):
+        headers = {}
+        if self.cookies:
+            headers['Cookie'] = '; '.join(f'{key}={value}' for key, value in self.cookies.items())
+        body = None
+        if fields is not None:
+            body = urlencode(fields)
+            headers['Content-Type'] = 'application/x-www-form-urlencoded'
+        started = time.perf_counter()
+        try:
+            self.connection.request(method, path, body, headers)
+            response = self.connection.getresponse()
+            content = response.read()
+        except (OSError, http.client.HTTPException) as exc:
+            self.connection.close()
+            self.stats.record(name, time.perf_counter() - started, type(exc).__name__)
+            return None
+        self.stats.record(name, time.perf_counter() - started, None if response.status == expect else response.status)
+        for header in response.msg.get_all('Set-Cookie') or []:
+            for key, morsel in SimpleCookie(header).items():
+                if morsel['max-age'] == '0' or not morsel.value:
+                    self.cookies.pop(key, None)
+                else:
+                    self.cookies[key] = morsel.value
+        return content.decode('utf-8', 'replace') if response.status == expect else None
+
+    def csrf_token(self, page):
+        match = CSRF_RE.search(page or '')
+        return match.group(1) if match else ''
+
+    def login(self, username):
+        page = self.request('login page', 'GET', reverse('login'))
+        fields = {'csrfmiddlewaretoken': self.csrf_token(page), 'username': username, 'password': PASSWORD}
+        return self.request('login', 'POST', reverse('login'), fields, expect=302) is not None
+
+    def close(self):
+        self.request('logout', 'GET', reverse('logout'), expect=302)
+        self.connection.close()
+
+
+# The scripted mix. Each step is one user action, possibly several requests;
+# the weights say how often a session picks it.
+
+def view_dashboard(session, rng):
+    session.request('dashboard', 'GET', reverse('user_dashboard'))
+
+
+def view_history(session, rng):
+    session.request('leave history', 'GET', reverse('leave_history'))
+
+
+def submit_leave(session, rng):
+    page = session.request('submit form', 'GET', reverse('submit_leave'))
+    if page is None:
+        return
+    start_date = timezone.localdate() + timedelta(days=rng.randrange(30, 3000))
+    session.request('submit', 'POST', reverse('submit_leave'), {
+        'csrfmiddlewaretoken': session.csrf_token(page),
+        'leave_type': rng.choice([choice for choice, _ in LeaveRequest.LEAVE_TYPE_CHOICES]),
+        'start_date': start_date.isoformat(),
+        'end_date': (start_date + timedelta(days=rng.randrange(3))).isoformat(),
+        'reason': rng.choice(REASONS),
+    }, expect=302)
+
+
+def view_admin_home(session, rng):
+    session.request('admin home', 'GET', reverse('admin_home'))
+
+
+def review_request(session, rng):
+    page = session.request('review queue', 'GET', reverse('admin_requests'))
+    # Only ever decide the load-test employees' own requests
+    pending = list(LeaveRequest.objects.filter(
+        id__in=[int(leave_id) for leave_id in UPDATE_RE.findall(page or '')],
+        user__email__endswith=EMAIL_DOMAIN,
+    ).values_list('id', flat=True))
+    if not pending:
+        return
+    session.request('approve', 'POST', reverse('update_leave_status', args=[rng.choice(pending)]), {
+        'csrfmiddlewaretoken': session.csrf_token(page),
+        'status': rng.choice(['approved', 'approved', 'rejected']),
+        'admin_comment': 'Load test',
+    }, expect=302)
+
+
+def search_requests(session, rng):
+    session.request('search', 'GET', f'{reverse("admin_tracking")}?{urlencode({"search": rng.choice(SEARCHES)})}')
+
+
+EMPLOYEE_MIX = ((view_dashboard, 5), (view_history, 3), (submit_leave, 2))
+REVIEWER_MIX = ((view_admin_home, 3), (review_request, 3), (search_requests, 2))
+
+
+class Command(BaseCommand):
+    help = 'Load-test the project under a multi-worker WSGI/ASGI server with a scripted mix of sessions'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--server', choices=['builtin', 'gunicorn', 'uvicorn'], default='builtin',
+                            help='builtin: pre-forked threaded WSGI workers; gunicorn/uvicorn must be installed')
+        parser.add_argument('--workers', type=int, help='Server worker processes', default=4)
+        parser.add_argument('--threads', type=int, help='Threads per gunicorn worker', default=4)
+        parser.add_argument('--url', help='Drive an already running server instead of starting one', default=None)
+        parser.add_argument('--users', type=int, help='Concurrent employee sessions', default=40)
+        parser.add_argument('--reviewers', type=int, help='Concurrent admin sessions', default=4)
+        parser.add_argument('--duration', type=float, help='Seconds of load after ramp-up starts', default=60)
+        parser.add_argument('--ramp-up', type=float, help='Seconds over which sessions log in', default=5)
+        parser.add_argument('--think', type=float, help='Mean pause between actions in seconds', default=0.5)
+        parser.add_argument('--random-seed', type=int, help='Seed for the session scripts', default=None)
+        parser.add_argument('--cleanup', action='store_true', help='Delete the load-test accounts afterwards')
+
+    def ensure_accounts(self, prefix, count, role):
+        existing = dict(CustomUser.objects.filter(username__startswith=prefix).values_list('username', 'email'))
+        taken = [username for username, email in existing.items() if not (email or '').endswith(EMAIL_DOMAIN)]
+        if taken:
+            raise CommandError(f'{len(taken)} accounts not created by load_test use the prefix {prefix!r} '
+                               f'(e.g. {taken[0]}); rename them before running it')
+        password = make_password(PASSWORD)
+        with transaction.atomic():
+            CustomUser.objects.bulk_create([
+                CustomUser(username=f'{prefix}{i}', email=f'{prefix}{i}{EMAIL_DOMAIN}', role=role,
+                           department=['Ops', 'HR', 'Finance', 'IT'][i % 4], password=password)
+                for i in range(count) if f'{prefix}{i}' not in existing
+            ], batch_size=1000)
+            # Accounts left by an earlier run keep working with the known password
+            CustomUser.objects.filter(username__in=list(existing)).update(password=password, is_active=True)
+        return [f'{prefix}{i}' for i in range(count)]
+
+    def start_server(self, options):
+        host = '127.0.0.1'
+        workers = options['workers']
+        quiet = options['verbosity'] < 2
+        if options['server'] == 'builtin':
+            if 'fork' not in multiprocessing.get_all_start_methods():
+                raise CommandError('The builtin server forks its workers; use --server gunicorn or uvicorn here')
+            listener = socket.create_server((host, 0), backlog=1024)
+            connections.close_all()
+            context = multiprocessing.get_context('fork')
+            processes = [
+                context.Process(target=serve_builtin, args=(listener, quiet), daemon=True) for _ in range(workers)
+            ]
+            for process in processes:
+                process.start()
+            port = listener.getsockname()[1]
+            listener.close()
+            return host, port, processes
+
+        module = options['server']
+        if importlib.util.find_spec(module) is None:
+            raise CommandError(f'{module} is not installed')
+        port = free_port(host)
+        if module == 'gunicorn':
+            app = settings.WSGI_APPLICATION.rsplit('.', 1)
+            command = ['gunicorn', ':'.join(app), '--bind', f'{host}:{port}', '--workers', str(workers),
+                       '--threads', str(options['threads'])]
+        else:
+            app = getattr(settings, 'ASGI_APPLICATION', None) or settings.WSGI_APPLICATION.replace('.wsgi.', '.asgi.')
+            command = ['uvicorn', ':'.join(app.rsplit('.', 1)), '--host', host, '--port', str(port),
+                       '--workers', str(workers), '--no-access-log']
+        output = subprocess.DEVNULL if quiet else None
+        process = subprocess.Popen([sys.executable, '-m', *command], cwd=settings.BASE_DIR,
+                                   stdout=output, stderr=output)
+        return host, port, [process]
+
+    def wait_until_up(self, host, port, processes, timeout=30):
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            if any(not is_alive(process) for process in processes):
+                raise CommandError('The server exited during startup (rerun with -v 2 to see its output)')
+            try:
+                socket.create_connection((host, port), timeout=1).close()
+                return
+            except OSError:
+                time.sleep(0.1)
+        raise CommandError(f'The server did not accept connections within {timeout}s')
+
+    def run_session(self, index, host, port, username, mix, stats, started, options):
+        rng = random.Random(None if options['random_seed'] is None else options['random_seed'] + index)
+        sessions = options['users'] + options['reviewers']
+        time.sleep(options['ramp_up'] * index / sessions)
+        # A loopback client of its own per session, so the per-IP login
+        # throttle sees many machines rather than one
+        source = (f'127.0.{index // 250}.{index % 250 + 2}', 0) if host.startswith('127.') else None
+        session = Session(host, port, stats, source)
+        if not session.login(username):
+            session.connection.close()
+            return
+        steps, weights = zip(*mix)
+        deadline = started + options['duration']
+        try:
+            while time.monotonic() < deadline:
+                rng.choices(steps, weights)[0](session, rng)
+                time.sleep(rng.expovariate(1 / options['think']) if options['think'] > 0 else 0)
+        finally:
+            # review_request reads the database from this thread
+            connections.close_all()
+        session.close()
+
+    def report(self, stats, elapsed):
+        self.stdout.write(f'\n{"endpoint":<16}{"requests":>9}{"req/s":>8}{"errors":>8}'
+                          f'{"p50 ms":>9}{"p90 ms":>9}{"p99 ms":>9}{"max ms":>9}')
+        total = failed = 0
+        for name in sorted(stats.latencies):
+            latencies = sorted(seconds * 1000 for seconds in stats.latencies[name])
+            errors = sum(stats.failures.get(name, Counter()).values())
+            total, failed = total + len(latencies), failed + errors
+            if len(latencies) > 1:
+                cuts = statistics.quantiles(latencies, n=100, method='inclusive')
+                p50, p90, p99 = cuts[49], cuts[89], cuts[98]
+            else:
+                p50 = p90 = p99 = latencies[0]
+            self.stdout.write(f'{name:<16}{len(latencies):>9}{len(latencies) / elapsed:>8.1f}'
+                              f'{errors / len(latencies):>8.1%}{p50:>9.1f}{p90:>9.1f}{p99:>9.1f}{latencies[-1]:>9.1f}')
+        self.stdout.write(f'{"total":<16}{total:>9}{total / elapsed:>8.1f}{failed / max(total, 1):>8.1%}')
+        for name in sorted(stats.failures):
+            breakdown = ', '.join(f'{failure} x{count}' for failure, count in stats.failures[name].most_common())
+            self.stdout.write(self.style.WARNING(f'{name}: {breakdown}'))
+
+    def handle(self, *args, **options):
+        employees = self.ensure_accounts(EMPLOYEE_PREFIX, options['users'], 'user')
+        reviewers = self.ensure_accounts(REVIEWER_PREFIX, options['reviewers'], 'admin')
+
+        processes = []
+        if options['url']:
+            url = urlsplit(options['url'])
+            host, port = url.hostname, url.port or 80
+        else:
+            host, port, processes = self.start_server(options)
+        try:
+            self.wait_until_up(host, port, processes)
+            self.stdout.write(f'{options["users"]} employee and {options["reviewers"]} admin sessions against '
+                              f'{options["url"] or options["server"]} ({host}:{port}) for {options["duration"]:.0f}s')
+            stats = Stats()
+            scripts = [(name, EMPLOYEE_MIX) for name in employees] + [(name, REVIEWER_MIX) for name in reviewers]
+            random.Random(options['random_seed']).shuffle(scripts)
+            started = time.monotonic()
+            with ThreadPoolExecutor(max_workers=len(scripts) or 1) as pool:
+                futures = [pool.submit(self.run_session, index, host, port, username, mix, stats, started, options)
+                           for index, (username, mix) in enumerate(scripts)]
+                for future in futures:
+                    future.result()
+            elapsed = time.monotonic() - started
+        finally:
+            for process in processes:
+                stop(process)
+
+        self.report(stats, elapsed)
+        if options['cleanup']:
+            deleted, _ = CustomUser.objects.filter(
+                Q(username__startswith=EMPLOYEE_PREFIX) | Q(username__startswith=REVIEWER_PREFIX),
+                email__endswith=EMAIL_DOMAIN,
+            ).delete()
+            self.stdout.write(self.style.SUCCESS(f'Deleted {deleted} load-test rows'))
@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from tracking.sync import prune_tombstones, tombstone_days
+
+
+class Command(BaseCommand):
+    help = 'Delete leave request tombstones older than LEAVE_SYNC_TOMBSTONE_DAYS'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, help='Keep tombstones this many days', default=None)
+
+    def handle(self, *args, **options):
+        days = options['days'] if options['days'] is not None else tombstone_days()
+        deleted = prune_tombstones(days)
+        self.stdout.write(self.style.SUCCESS(f'Deleted {deleted} tombstones older than {days} days'))
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from tracking.hierarchy import rebuild
+
+
+class Command(BaseCommand):
+    help = 'Regenerate the ReportingLine closure table from CustomUser.manager'
+
+    def handle(self, *args, **options):
+        rows = rebuild()
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt reporting lines: {rows} rows'))
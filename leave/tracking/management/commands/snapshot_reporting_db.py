@@ -0,0 +1,51 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from tracking.reporting import snapshot_age, take_snapshot
+
+
+def describe_age(seconds):
+    if seconds is None:
+        return 'no snapshot yet'
+    if seconds < 120:
+        return f'{seconds:.0f}s old'
+    if seconds < 7200:
+        return f'{seconds / 60:.0f}m old'
+    return f'{seconds / 3600:.1f}h old'
+
+
+class Command(BaseCommand):
+    help = 'Copy the database to the reporting snapshot with the SQLite online backup API'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--every', type=int, help='Keep running and take a snapshot every N seconds', default=None)
+        parser.add_argument('--if-older-than', type=int, help='Skip unless the snapshot is at least N seconds old',
+                            default=None)
+        parser.add_argument('--pages', type=int, help='Pages copied per backup step (-1: all in one step)', default=-1)
+        parser.add_argument('--status', action='store_true', help='Only report how old the snapshot is')
+
+    def snapshot(self, options):
+        age = snapshot_age()
+        if options['if_older_than'] is not None and age is not None and age < options['if_older_than']:
+            self.stdout.write(f'Reporting snapshot is {describe_age(age)}; skipped')
+            return
+        path, size, elapsed = take_snapshot(pages=options['pages'])
+        replaced = f'replaced one {describe_age(age)}' if age is not None else 'first snapshot'
+        self.stdout.write(self.style.SUCCESS(
+            f'Wrote reporting snapshot {path} ({size / 1048576:.1f} MB) in {elapsed:.2f}s ({replaced})'
+        ))
+
+    def handle(self, *args, **options):
+        if options['status']:
+            self.stdout.write(f'Reporting snapshot is {describe_age(snapshot_age())}')
+            return
+        if not options['every']:
+            self.snapshot(options)
+            return
+        try:
+            while True:
+                self.snapshot(options)
+                time.sleep(options['every'])
+        except KeyboardInterrupt:
+            pass
@@ -0,0 +1,54 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.test import Client
+
+from tracking.models import CustomUser
+from tracking.warmup import run_warmup
+
+
+class Command(BaseCommand):
+    help = 'Precompile templates, resolve URLs and prime caches; optionally time the first requests'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--measure', action='store_true',
+                            help='Time the first request to each page after warming up')
+        parser.add_argument('--skip-warmup', action='store_true',
+                            help='With --measure, time the first requests cold for comparison')
+        parser.add_argument('--username', type=str, help='Admin user for --measure', default='admin')
+        parser.add_argument('--url', action='append', dest='urls',
+                            help='Page to time with --measure (repeatable)')
+
+    def get_client(self, username):
+        user = CustomUser.objects.filter(username=username).first()
+        if user is None:
+            return None
+        hosts = [host for host in settings.ALLOWED_HOSTS if host != '*' and not host.startswith('.')]
+        client = Client(HTTP_HOST=hosts[0] if hosts else 'localhost')
+        client.force_login(user)
+        return client
+
+    def handle(self, *args, **options):
+        urls = options['urls'] or ['/dashboard/admin/tracking/', '/dashboard/admin/users/']
+        client = None
+        if options['measure']:
+            client = self.get_client(options['username'])
+            if client is None:
+                self.stdout.write(self.style.ERROR(f'User "{options["username"]}" not found'))
+                return
+
+        if not options['skip_warmup']:
+            for step, count, seconds in run_warmup():
+                self.stdout.write(f'{step:<10} {count:>6} items  {seconds * 1000:8.1f} ms')
+
+        if client is not None:
+            label = 'cold' if options['skip_warmup'] else 'after warmup'
+            self.stdout.write(f'\nFirst request ({label}):')
+            for url in urls:
+                started = time.perf_counter()
+                response = client.get(url)
+                elapsed = (time.perf_counter() - started) * 1000
+                self.stdout.write(f'  {url:<30} {elapsed:8.1f} ms  [{response.status_code}]')
+
+        self.stdout.write(self.style.SUCCESS('Warmup complete'))
@@ -0,0 +1,126 @@
+# Generated by Django 6.0.1 on 2026-10-19 14:03
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("tracking", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="LeaveBalance",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "leave_type",
+                    models.CharField(
+                        choices=[
+                            ("sick", "Sick Leave"),
+                            ("casual", "Casual Leave"),
+                            ("vacation", "Vacation"),
+                            ("emergency", "Emergency Leave"),
+                            ("other", "Other"),
+                        ],
+                        max_length=20,
+                    ),
+                ),
+                ("year", models.PositiveSmallIntegerField()),
+                ("entitled_days", models.IntegerField(default=0)),
+                ("carried_over_days", models.IntegerField(default=0)),
+                ("used_days", models.IntegerField(default=0)),
+                ("closed", models.BooleanField(default=False)),
+                ("updated_on", models.DateTimeField(auto_now=True)),
+                (
+                    "user",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="leave_balances",
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+            ],
+            options={
+                "ordering": ["year", "leave_type"],
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("user", "leave_type", "year"),
+                        name="unique_leave_balance",
+                    )
+                ],
+            },
+        ),
+        migrations.CreateModel(
+            name="LeaveLedgerEntry",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "leave_type",
+                    models.CharField(
+                        choices=[
+                            ("sick", "Sick Leave"),
+                            ("casual", "Casual Leave"),
+                            ("vacation", "Vacation"),
+                            ("emergency", "Emergency Leave"),
+                            ("other", "Other"),
+                        ],
+                        max_length=20,
+                    ),
+                ),
+                ("year", models.PositiveSmallIntegerField()),
+                (
+                    "kind",
+                    models.CharField(
+                        choices=[
+                            ("grant", "Annual Grant"),
+                            ("carry_over", "Carry Over"),
+                            ("usage", "Usage"),
+                            ("adjustment", "Adjustment"),
+                        ],
+                        max_length=20,
+                    ),
+                ),
+                ("days", models.IntegerField()),
+                ("note", models.CharField(blank=True, max_length=255)),
+                ("created_on", models.DateTimeField(default=django.utils.timezone.now)),
+                (
+                    "user",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="leave_ledger",
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+            ],
+            options={
+                "ordering": ["-created_on"],
+                "indexes": [
+                    models.Index(
+                        fields=["user", "year", "leave_type"],
+                        name="tracking_le_user_id_dfc643_idx",
+                    )
+                ],
+            },
+        ),
+    ]
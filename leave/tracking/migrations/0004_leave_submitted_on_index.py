@@ -0,0 +1,19 @@
+# Generated by Django 6.0.1 on 2026-10-19 14:32
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("tracking", "0003_audit_log_entry"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="leaverequest",
+            index=models.Index(
+                fields=["-submitted_on", "-id"], name="leave_submitted_on_idx"
+            ),
+        ),
+    ]
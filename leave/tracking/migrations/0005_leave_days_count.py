@@ -0,0 +1,27 @@
+# Generated by Django 6.0.1 on 2026-10-19 14:16
+
+import tracking.models
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("tracking", "0004_leave_submitted_on_index"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="leaverequest",
+            name="days_count",
+            field=models.GeneratedField(
+                db_persist=True,
+                expression=tracking.models.DayCount("start_date", "end_date"),
+                output_field=models.IntegerField(),
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="leaverequest",
+            index=models.Index(fields=["days_count"], name="leave_days_count_idx"),
+        ),
+    ]
@@ -0,0 +1,79 @@
+# Generated by Django 6.0.1 on 2026-10-19 15:02
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("tracking", "0005_leave_days_count"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="customuser",
+            name="manager",
+            field=models.ForeignKey(
+                blank=True,
+                help_text="Who this user reports to; managers review leave for everyone below them",
+                null=True,
+                on_delete=django.db.models.deletion.SET_NULL,
+                related_name="direct_reports",
+                to=settings.AUTH_USER_MODEL,
+            ),
+        ),
+        migrations.AlterField(
+            model_name="customuser",
+            name="role",
+            field=models.CharField(
+                choices=[("admin", "Admin"), ("manager", "Manager"), ("user", "User")],
+                default="user",
+                max_length=10,
+            ),
+        ),
+        migrations.CreateModel(
+            name="ReportingLine",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("depth", models.PositiveSmallIntegerField()),
+                (
+                    "ancestor",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="reporting_descendants",
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+                (
+                    "descendant",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="reporting_ancestors",
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+            ],
+            options={
+                "indexes": [
+                    models.Index(
+                        fields=["descendant", "depth"], name="reporting_line_up_idx"
+                    )
+                ],
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("ancestor", "descendant"), name="unique_reporting_line"
+                    )
+                ],
+            },
+        ),
+    ]
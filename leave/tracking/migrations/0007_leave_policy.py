@@ -0,0 +1,74 @@
+# Generated by Django 6.0.1 on 2026-10-19 15:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("tracking", "0006_manager_hierarchy"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="LeavePolicy",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("name", models.CharField(max_length=100)),
+                (
+                    "kind",
+                    models.CharField(
+                        choices=[
+                            ("max_consecutive_days", "Maximum consecutive days"),
+                            ("min_notice_days", "Minimum notice (days)"),
+                            ("blackout", "Blackout period"),
+                            (
+                                "department_capacity",
+                                "Maximum absent per department per day",
+                            ),
+                        ],
+                        max_length=30,
+                    ),
+                ),
+                (
+                    "leave_type",
+                    models.CharField(
+                        blank=True,
+                        choices=[
+                            ("sick", "Sick Leave"),
+                            ("casual", "Casual Leave"),
+                            ("vacation", "Vacation"),
+                            ("emergency", "Emergency Leave"),
+                            ("other", "Other"),
+                        ],
+                        max_length=20,
+                    ),
+                ),
+                ("department", models.CharField(blank=True, max_length=100)),
+                ("value", models.PositiveIntegerField(blank=True, null=True)),
+                ("start_date", models.DateField(blank=True, null=True)),
+                ("end_date", models.DateField(blank=True, null=True)),
+                (
+                    "message",
+                    models.CharField(
+                        blank=True,
+                        help_text="Shown to the employee instead of the default text",
+                        max_length=200,
+                    ),
+                ),
+                ("active", models.BooleanField(default=True)),
+                ("updated_on", models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                "verbose_name_plural": "leave policies",
+            },
+        ),
+    ]
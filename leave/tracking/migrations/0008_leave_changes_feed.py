@@ -0,0 +1,43 @@
+# Generated by Django 6.0.1 on 2026-10-19 16:25
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("tracking", "0007_leave_policy"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="LeaveRequestTombstone",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("leave_id", models.PositiveBigIntegerField()),
+                ("user_id", models.PositiveBigIntegerField()),
+                ("deleted_on", models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name="leaverequest",
+            index=models.Index(
+                fields=["updated_on", "id"], name="leave_updated_on_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="leaverequesttombstone",
+            index=models.Index(
+                fields=["deleted_on", "id"], name="leave_tombstone_deleted_idx"
+            ),
+        ),
+    ]
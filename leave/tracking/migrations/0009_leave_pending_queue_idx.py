@@ -0,0 +1,21 @@
+# Generated by Django 6.0.1 on 2026-10-19 16:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("tracking", "0008_leave_changes_feed"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="leaverequest",
+            index=models.Index(
+                condition=models.Q(("status", "pending")),
+                fields=["start_date", "id"],
+                name="leave_pending_start_idx",
+            ),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 6.0.1 on 2026-10-19 17:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("tracking", "0010_cache_version"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="customuser",
+            name="feed_secret",
+            field=models.CharField(blank=True, editable=False, max_length=32),
+        ),
+    ]
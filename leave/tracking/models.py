@@ -1,19 +1,112 @@
 # khora/models.py
 from django.db import models
+from django.db.models.functions import Lower
 from django.contrib.auth.models import AbstractUser
 from django.utils import timezone
+from django.core.exceptions import ValidationError
+from django.core.serializers.json import DjangoJSONEncoder
 
 class CustomUser(AbstractUser):
     ROLE_CHOICES = (
         ('admin', 'Admin'),
+        ('manager', 'Manager'),
         ('user', 'User'),
     )
     role = models.CharField(max_length=10, choices=ROLE_CHOICES, default='user')
     phone = models.CharField(max_length=15, blank=True, null=True)
     department = models.CharField(max_length=100, blank=True, null=True)
+    manager = models.ForeignKey(
+        'self', on_delete=models.SET_NULL, blank=True, null=True, related_name='direct_reports',
+        help_text='Who this user reports to; managers review leave for everyone below them',
+    )
+    # Bound into calendar feed URLs (tracking/calendar_feeds.py); rotating it revokes them
+    feed_secret = models.CharField(max_length=32, blank=True, editable=False)
+    
+    class Meta(AbstractUser.Meta):
+        indexes = [
+            # Case-insensitive username prefix search in the admin (tracking/admin.py)
+            models.Index(Lower('username'), name='user_username_lower_idx'),
+        ]
     
     def __str__(self):
         return f"{self.username} ({self.role})"
+    
+    @property
+    def is_employee(self):
+        """Takes leave and holds balances: every role but admin (see hierarchy.employees)"""
+        return self.role != 'admin'
+    
+    def clean(self):
+        super().clean()
+        if self.manager_id and self.pk and (
+            self.manager_id == self.pk
+            or ReportingLine.objects.filter(ancestor_id=self.pk, descendant_id=self.manager_id).exists()
+        ):
+            raise ValidationError({'manager': 'A user cannot report to themselves or to someone in their own team.'})
+
+class ReportingLine(models.Model):
+    """Closure table of the reports-to tree: one row per (manager above, user below).
+    
+    ``depth`` is 1 for a direct report, 2 for a report's report and so on, so
+    a whole subtree is a single indexed lookup on ``ancestor``. Rows are kept
+    in step with CustomUser.manager by tracking/signals.py (see
+    tracking/hierarchy.py); rebuild_hierarchy regenerates them from scratch.
+    """
+    ancestor = models.ForeignKey(CustomUser, on_delete=models.CASCADE, related_name='reporting_descendants')
+    descendant = models.ForeignKey(CustomUser, on_delete=models.CASCADE, related_name='reporting_ancestors')
+    depth = models.PositiveSmallIntegerField()
+    
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['ancestor', 'descendant'], name='unique_reporting_line'),
+        ]
+        indexes = [
+            models.Index(fields=['descendant', 'depth'], name='reporting_line_up_idx'),
+        ]
+    
+    def __str__(self):
+        return f"{self.descendant_id} -> {self.ancestor_id} ({self.depth})"
+
+class DayCount(models.Func):
+    """Inclusive number of days from a start date column to an end date column.
+    
+    Only columns and deterministic functions are used, so it can back a
+    stored generated column on every backend Django supports.
+    """
+    arity = 2
+    output_field = models.IntegerField()
+    templates = {
+        'sqlite': 'CAST(julianday(%(end)s) - julianday(%(start)s) AS INTEGER) + 1',
+        'mysql': 'DATEDIFF(%(end)s, %(start)s) + 1',
+    }
+    
+    def as_sql(self, compiler, connection, **extra_context):
+        start, start_params = compiler.compile(self.source_expressions[0])
+        end, end_params = compiler.compile(self.source_expressions[1])
+        template = self.templates.get(connection.vendor, '(%(end)s - %(start)s + 1)')
+        return template % {'start': start, 'end': end}, (*start_params, *end_params)
+
+class LeaveRequestQuerySet(models.QuerySet):
+    ROW_FIELDS = ('id', 'leave_type', 'start_date', 'end_date', 'days_count', 'status', 'submitted_on')
+    
+    def rows(self, *extra_fields):
+        """Projected rows for list pages.
+        
+        Joins the user's username/department, selects only the displayed
+        columns and adds precomputed labels, so templates never touch a
+        model instance or trigger a per-row user query.
+        """
+        leave_types = dict(LeaveRequest.LEAVE_TYPE_CHOICES)
+        statuses = dict(LeaveRequest.STATUS_CHOICES)
+        rows = list(self.values(
+            *self.ROW_FIELDS, *extra_fields,
+            username=models.F('user__username'),
+            department=models.F('user__department'),
+        ))
+        for row in rows:
+            row['leave_type_label'] = leave_types.get(row['leave_type'], row['leave_type'])
+            row['status_label'] = statuses.get(row['status'], row['status'])
+        return rows
 
 class LeaveRequest(models.Model):
     STATUS_CHOICES = (
@@ -39,13 +132,169 @@ class LeaveRequest(models.Model):
     admin_comment = models.TextField(blank=True, null=True)
     submitted_on = models.DateTimeField(default=timezone.now)
     updated_on = models.DateTimeField(auto_now=True)
+    # Computed and stored by the database, so it can be summed, sorted and filtered in SQL
+    days_count = models.GeneratedField(
+        expression=DayCount('start_date', 'end_date'),
+        output_field=models.IntegerField(),
+        db_persist=True,
+    )
+    
+    objects = LeaveRequestQuerySet.as_manager()
     
     class Meta:
         ordering = ['-submitted_on']
+        indexes = [
+            models.Index(fields=['-submitted_on', '-id'], name='leave_submitted_on_idx'),
+            models.Index(fields=['days_count'], name='leave_days_count_idx'),
+            models.Index(fields=['updated_on', 'id'], name='leave_updated_on_idx'),
+            # Only pending rows, in queue order: the pending queue reads this
+            # index alone, however much decided history the table holds
+            models.Index(fields=['start_date', 'id'], condition=models.Q(status='pending'),
+                         name='leave_pending_start_idx'),
+        ]
     
     def __str__(self):
         return f"{self.user.username} - {self.leave_type} ({self.status})"
+
+class LeaveRequestTombstone(models.Model):
+    """Marker left behind by a deleted LeaveRequest for the changes feed (tracking/sync.py)"""
+    leave_id = models.PositiveBigIntegerField()
+    user_id = models.PositiveBigIntegerField()
+    deleted_on = models.DateTimeField(default=timezone.now)
+    
+    class Meta:
+        indexes = [
+            models.Index(fields=['deleted_on', 'id'], name='leave_tombstone_deleted_idx'),
+        ]
+    
+    def __str__(self):
+        return f"Leave request #{self.leave_id} deleted {self.deleted_on:%Y-%m-%d %H:%M}"
+
+class LeaveBalance(models.Model):
+    """Per-user, per-type entitlement for one leave year.
+    
+    ``used_days`` is kept current as requests are approved (tracking/signals.py)
+    and recomputed by the close_leave_year command, so dashboards can read
+    the remaining balance without summing requests.
+    """
+    user = models.ForeignKey(CustomUser, on_delete=models.CASCADE, related_name='leave_balances')
+    leave_type = models.CharField(max_length=20, choices=LeaveRequest.LEAVE_TYPE_CHOICES)
+    year = models.PositiveSmallIntegerField()
+    entitled_days = models.IntegerField(default=0)
+    carried_over_days = models.IntegerField(default=0)
+    used_days = models.IntegerField(default=0)
+    closed = models.BooleanField(default=False)
+    updated_on = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        ordering = ['year', 'leave_type']
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'leave_type', 'year'], name='unique_leave_balance'),
+        ]
+    
+    def __str__(self):
+        return f"{self.user.username} - {self.leave_type} {self.year}"
     
     @property
-    def days_count(self):
-        return (self.end_date - self.start_date).days + 1
\ No newline at end of file
+    def remaining_days(self):
+        return self.entitled_days + self.carried_over_days - self.used_days
+
+class LeaveLedgerEntry(models.Model):
+    KIND_CHOICES = (
+        ('grant', 'Annual Grant'),
+        ('carry_over', 'Carry Over'),
+        ('usage', 'Usage'),
+        ('adjustment', 'Adjustment'),
+    )
+    
+    user = models.ForeignKey(CustomUser, on_delete=models.CASCADE, related_name='leave_ledger')
+    leave_type = models.CharField(max_length=20, choices=LeaveRequest.LEAVE_TYPE_CHOICES)
+    year = models.PositiveSmallIntegerField()
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES)
+    days = models.IntegerField()
+    note = models.CharField(max_length=255, blank=True)
+    created_on = models.DateTimeField(default=timezone.now)
+    
+    class Meta:
+        ordering = ['-created_on']
+        indexes = [
+            models.Index(fields=['user', 'year', 'leave_type']),
+        ]
+    
+    def __str__(self):
+        return f"{self.user.username} - {self.kind} {self.days} ({self.leave_type} {self.year})"
+
+class LeavePolicy(models.Model):
+    """One declarative leave rule, compiled into a predicate by tracking/policies.py.
+    
+    ``leave_type`` and ``department`` narrow the rule; left blank it applies to
+    every type or department. ``value`` is the day or head count for the kind.
+    """
+    KIND_CHOICES = (
+        ('max_consecutive_days', 'Maximum consecutive days'),
+        ('min_notice_days', 'Minimum notice (days)'),
+        ('blackout', 'Blackout period'),
+        ('department_capacity', 'Maximum absent per department per day'),
+    )
+    
+    name = models.CharField(max_length=100)
+    kind = models.CharField(max_length=30, choices=KIND_CHOICES)
+    leave_type = models.CharField(max_length=20, choices=LeaveRequest.LEAVE_TYPE_CHOICES, blank=True)
+    department = models.CharField(max_length=100, blank=True)
+    value = models.PositiveIntegerField(blank=True, null=True)
+    start_date = models.DateField(blank=True, null=True)
+    end_date = models.DateField(blank=True, null=True)
+    message = models.CharField(max_length=200, blank=True, help_text='Shown to the employee instead of the default text')
+    active = models.BooleanField(default=True)
+    updated_on = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        verbose_name_plural = 'leave policies'
+    
+    def __str__(self):
+        return self.name
+    
+    def clean(self):
+        super().clean()
+        if self.kind == 'blackout':
+            if not self.start_date or not self.end_date:
+                raise ValidationError('A blackout period needs a start and an end date.')
+            if self.start_date > self.end_date:
+                raise ValidationError({'end_date': 'End date must be after start date'})
+        elif self.value is None:
+            raise ValidationError({'value': 'This kind of policy needs a value.'})
+
+class AuditLogEntry(models.Model):
+    """Append-only record of changes to leave requests and user profiles"""
+    ACTION_CHOICES = (
+        ('create', 'Created'),
+        ('update', 'Updated'),
+        ('delete', 'Deleted'),
+    )
+    
+    actor = models.ForeignKey(CustomUser, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    actor_username = models.CharField(max_length=150, blank=True)
+    action = models.CharField(max_length=10, choices=ACTION_CHOICES)
+    model_name = models.CharField(max_length=50)
+    object_id = models.CharField(max_length=64)
+    object_repr = models.CharField(max_length=200)
+    changes = models.JSONField(default=dict, encoder=DjangoJSONEncoder)
+    created_on = models.DateTimeField(default=timezone.now, db_index=True)
+    
+    class Meta:
+        ordering = ['-created_on', '-id']
+        indexes = [
+            models.Index(fields=['model_name', 'object_id']),
+        ]
+    
+    def __str__(self):
+        return f"{self.actor_username or 'system'} {self.action} {self.model_name} #{self.object_id}"
+
+
+class CacheVersion(models.Model):
+    """Shared version counter for per-process caches (see tracking/versions.py)"""
+    name = models.CharField(max_length=50, primary_key=True)
+    version = models.PositiveBigIntegerField(default=0)
+    
+    def __str__(self):
+        return f"{self.name} v{self.version}"
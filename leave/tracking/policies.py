@@ -0,0 +1,209 @@
+# khora/policies.py
+import threading
+from collections import defaultdict, namedtuple
+from datetime import timedelta
+
+from django.db.models import F
+from django.utils import timezone
+
+from . import versions
+from .models import LeavePolicy, LeaveRequest
+
+VERSION_NAME = 'leave-policies'
+
+# What a predicate needs to know about a request, whether it comes from a
+# form or from the pending queue. ``notice_from`` is the day the notice period
+# is counted from: today for a new submission, the submission day otherwise.
+Candidate = namedtuple('Candidate', 'id user_id department leave_type start_date end_date notice_from')
+
+
+def _days(start_date, end_date):
+    return (end_date - start_date).days + 1
+
+
+class Predicate:
+    needs_absences = False
+
+    def __init__(self, policy):
+        self.policy_id = policy.pk
+        self.name = policy.name
+        self.leave_type = policy.leave_type
+        self.department = policy.department
+        self.message = policy.message
+        self.value = policy.value
+
+    def applies(self, candidate):
+        return ((not self.leave_type or self.leave_type == candidate.leave_type)
+                and (not self.department or self.department == candidate.department))
+
+    def violation(self, candidate, absences):
+        """Message for a broken rule, or None"""
+        raise NotImplementedError
+
+    def fail(self, default):
+        return self.message or default
+
+
+class MaxConsecutiveDays(Predicate):
+    def violation(self, candidate, absences):
+        if _days(candidate.start_date, candidate.end_date) > self.value:
+            return self.fail(f'{self.name}: at most {self.value} consecutive days')
+
+
+class MinNotice(Predicate):
+    def violation(self, candidate, absences):
+        if (candidate.start_date - candidate.notice_from).days < self.value:
+            return self.fail(f'{self.name}: request at least {self.value} days in advance')
+
+
+class Blackout(Predicate):
+    def __init__(self, policy):
+        super().__init__(policy)
+        self.start_date = policy.start_date
+        self.end_date = policy.end_date
+
+    def violation(self, candidate, absences):
+        if candidate.start_date <= self.end_date and candidate.end_date >= self.start_date:
+            return self.fail(f'{self.name}: no leave from {self.start_date:%b %d, %Y} to {self.end_date:%b %d, %Y}')
+
+
+class DepartmentCapacity(Predicate):
+    needs_absences = True
+
+    def violation(self, candidate, absences):
+        if not candidate.department:
+            return None
+        peak = absences.peak(candidate.department, candidate.start_date, candidate.end_date, candidate.user_id)
+        if peak + 1 > self.value:
+            return self.fail(f'{self.name}: at most {self.value} people from {candidate.department} can be away on one day')
+
+
+PREDICATES = {
+    'max_consecutive_days': MaxConsecutiveDays,
+    'min_notice_days': MinNotice,
+    'blackout': Blackout,
+    'department_capacity': DepartmentCapacity,
+}
+
+
+class Absences:
+    """Who is on approved leave, by department and day, loaded in one query"""
+
+    def __init__(self, rows=()):
+        self._days = defaultdict(lambda: defaultdict(set))
+        for user_id, department, start_date, end_date in rows:
+            day = start_date
+            while day <= end_date:
+                self._days[department][day].add(user_id)
+                day += timedelta(days=1)
+
+    @classmethod
+    def load(cls, departments, start_date, end_date, exclude_ids=()):
+        departments = [department for department in departments if department]
+        if not departments:
+            return cls()
+        rows = LeaveRequest.objects.filter(
+            status='approved',
+            user__department__in=departments,
+            start_date__lte=end_date,
+            end_date__gte=start_date,
+        ).exclude(id__in=list(exclude_ids)).values_list('user_id', F('user__department'), 'start_date', 'end_date')
+        return cls(rows)
+
+    def peak(self, department, start_date, end_date, user_id):
+        """Most other people from ``department`` away on any day of the range"""
+        by_day = self._days.get(department)
+        if not by_day:
+            return 0
+        peak, day = 0, start_date
+        while day <= end_date:
+            away = by_day.get(day)
+            if away:
+                peak = max(peak, len(away - {user_id}))
+            day += timedelta(days=1)
+        return peak
+
+
+def compile_policies():
+    return tuple(PREDICATES[policy.kind](policy) for policy in LeavePolicy.objects.filter(active=True).order_by('id')
+                 if policy.kind in PREDICATES)
+
+
+class CompiledPolicies:
+    """Active policies compiled once per process.
+
+    Every policy change bumps the 'leave-policies' counter in the database
+    in the same transaction (tracking/signals.py, tracking/versions.py); each
+    process reads it before use and recompiles when it moved, so every worker
+    sees the change as soon as it commits.
+    """
+
+    def __init__(self):
+        self._version = None
+        self._predicates = ()
+        self._lock = threading.Lock()
+
+    def get(self):
+        # Read before compiling, so a change committed mid-compile bumps past it
+        version = versions.current(VERSION_NAME)
+        if version != self._version:
+            with self._lock:
+                if version != self._version:
+                    self._predicates = compile_policies()
+                    self._version = version
+        return self._predicates
+
+    def invalidate(self):
+        versions.bump(VERSION_NAME)
+
+    def clear(self):
+        with self._lock:
+            self._predicates = ()
+            self._version = None
+
+
+compiled_policies = CompiledPolicies()
+
+
+def evaluate(candidate, predicates=None, absences=None):
+    """Messages for every policy ``candidate`` breaks"""
+    predicates = compiled_policies.get() if predicates is None else predicates
+    applicable = [predicate for predicate in predicates if predicate.applies(candidate)]
+    if absences is None and any(predicate.needs_absences for predicate in applicable):
+        exclude = [candidate.id] if candidate.id else []
+        absences = Absences.load([candidate.department], candidate.start_date, candidate.end_date, exclude)
+    return [message for message in (predicate.violation(candidate, absences) for predicate in applicable) if message]
+
+
+def check_pending(queryset=None):
+    """Re-check a queue of pending requests in one pass.
+
+    Two queries whatever the queue size: the pending rows with their user's
+    department, and the approved absences overlapping them. Returns
+    {request_id: [messages]} for the requests that break a policy.
+    """
+    predicates = compiled_policies.get()
+    if queryset is None:
+        queryset = LeaveRequest.objects.all()
+    rows = list(queryset.filter(status='pending').values_list(
+        'id', 'user_id', F('user__department'), 'leave_type', 'start_date', 'end_date', 'submitted_on',
+    ))
+    if not rows or not predicates:
+        return {}
+
+    absences = Absences()
+    if any(predicate.needs_absences for predicate in predicates):
+        absences = Absences.load(
+            {row[2] for row in rows},
+            min(row[4] for row in rows),
+            max(row[5] for row in rows),
+        )
+
+    violations = {}
+    for request_id, user_id, department, leave_type, start_date, end_date, submitted_on in rows:
+        candidate = Candidate(request_id, user_id, department, leave_type, start_date, end_date,
+                              timezone.localdate(submitted_on))
+        messages = evaluate(candidate, predicates, absences)
+        if messages:
+            violations[request_id] = messages
+    return violations
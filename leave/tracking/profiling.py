@@ -0,0 +1,158 @@
+# khora/profiling.py
+import cProfile
+import io
+import json
+import logging
+import pstats
+import re
+import threading
+import time
+import uuid
+from pathlib import Path
+
+from django.conf import settings
+from django.db import connection
+from django.urls import reverse
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+REPORT_ID_RE = re.compile(r'^[0-9]{8}T[0-9]{6}-[0-9a-f]{8}$')
+
+# cProfile cannot run two profilers at once, so only one request is profiled at a time
+_profile_lock = threading.Lock()
+
+
+def report_dir():
+    path = Path(getattr(settings, 'LEAVE_PROFILE_DIR', settings.BASE_DIR / 'profiles'))
+    path.mkdir(parents=True, exist_ok=True)
+    return path
+
+
+def max_reports():
+    return getattr(settings, 'LEAVE_PROFILE_MAX_REPORTS', 20)
+
+
+class QueryRecorder:
+    """connection.execute_wrapper that keeps each SQL statement with its duration"""
+
+    def __init__(self):
+        self.queries = []
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries.append({
+                'sql': sql,
+                'params': repr(params)[:500],
+                'ms': round((time.perf_counter() - started) * 1000, 3),
+            })
+
+
+def wants_profile(request):
+    return request.GET.get('_profile') == '1' or request.headers.get('X-Profile') == '1'
+
+
+class ProfilingMiddleware:
+    """Profile one request on demand (?_profile=1 or X-Profile: 1), for admins only"""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not wants_profile(request):
+            return self.get_response(request)
+        user = getattr(request, 'user', None)
+        if user is None or not user.is_authenticated or user.role != 'admin':
+            return self.get_response(request)
+        if not _profile_lock.acquire(blocking=False):
+            response = self.get_response(request)
+            response['X-Profile-Skipped'] = 'another request is being profiled'
+            return response
+
+        try:
+            profiler = cProfile.Profile()
+            recorder = QueryRecorder()
+            started = time.perf_counter()
+            with connection.execute_wrapper(recorder):
+                profiler.enable()
+                try:
+                    response = self.get_response(request)
+                finally:
+                    profiler.disable()
+            elapsed = time.perf_counter() - started
+        finally:
+            _profile_lock.release()
+
+        # A profile that cannot be written must never cost the request itself
+        try:
+            report_id = save_report(request, response, profiler, recorder.queries, elapsed)
+        except Exception:
+            logger.exception('Could not save the profile of %s', request.path)
+            return response
+        response['X-Profile-Report'] = reverse('profile_report', args=[report_id])
+        return response
+
+
+def save_report(request, response, profiler, queries, elapsed):
+    """Write the .prof and .json pair for one request and trim the ring"""
+    now = timezone.now()
+    report_id = f"{now:%Y%m%dT%H%M%S}-{uuid.uuid4().hex[:8]}"
+    directory = report_dir()
+    profiler.dump_stats(directory / f'{report_id}.prof')
+
+    summary = io.StringIO()
+    pstats.Stats(profiler, stream=summary).sort_stats('cumulative').print_stats(40)
+    meta = {
+        'id': report_id,
+        'created_on': now.isoformat(),
+        'user': request.user.username,
+        'method': request.method,
+        'path': request.get_full_path(),
+        'status': response.status_code,
+        'ms': round(elapsed * 1000, 1),
+        'query_count': len(queries),
+        'query_ms': round(sum(query['ms'] for query in queries), 1),
+        'queries': queries,
+        'stats': summary.getvalue(),
+    }
+    (directory / f'{report_id}.json').write_text(json.dumps(meta), encoding='utf-8')
+
+    # Oldest first by write time; ids only resolve to the second
+    reports = sorted(directory.glob('*.json'), key=lambda path: path.stat().st_mtime_ns)
+    for old in reports[:-max_reports()]:
+        old.unlink(missing_ok=True)
+        old.with_suffix('.prof').unlink(missing_ok=True)
+    return report_id
+
+
+def list_reports():
+    """Newest first; queries and stats are left out of the listing"""
+    reports = []
+    for path in sorted(report_dir().glob('*.json'), reverse=True):
+        try:
+            meta = json.loads(path.read_text(encoding='utf-8'))
+        except (OSError, ValueError):
+            continue
+        meta.pop('queries', None)
+        meta.pop('stats', None)
+        reports.append(meta)
+    return reports
+
+
+def load_report(report_id):
+    if not REPORT_ID_RE.match(report_id):
+        return None
+    path = report_dir() / f'{report_id}.json'
+    if not path.exists():
+        return None
+    return json.loads(path.read_text(encoding='utf-8'))
+
+
+def report_file(report_id):
+    if not REPORT_ID_RE.match(report_id):
+        return None
+    path = report_dir() / f'{report_id}.prof'
+    return path if path.exists() else None
@@ -0,0 +1,142 @@
+# khora/reporting.py
+import os
+import sqlite3
+import time
+from datetime import datetime, timezone as dt_timezone
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.db import DEFAULT_DB_ALIAS, DatabaseError, connections
+from django.db.migrations.recorder import MigrationRecorder
+
+# Read-only reports and exports read from a point-in-time copy of the
+# database taken with SQLite's online backup API (snapshot_reporting_db), so
+# their long scans never hold a read transaction on the live file; they show
+# how old their figures are. Pages that act on what they show stay on the
+# live database. The copy is written next
+# to the snapshot and renamed over it, so a reader only ever sees a whole
+# snapshot; its mtime is set to the moment the copy started.
+
+
+def reporting_alias():
+    return getattr(settings, 'LEAVE_REPORTING_DB', 'reporting')
+
+
+def reporting_pages():
+    return getattr(settings, 'LEAVE_REPORTING_PAGES', ())
+
+
+def max_age():
+    return getattr(settings, 'LEAVE_REPORTING_MAX_AGE', None)
+
+
+class ReportingRouter:
+    """Keep migrations off the snapshot; it is only ever replaced by a backup"""
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        if db == reporting_alias():
+            return False
+        return None
+
+
+def snapshot_path():
+    alias = reporting_alias()
+    if alias not in settings.DATABASES:
+        raise ImproperlyConfigured(f'LEAVE_REPORTING_DB names an unknown database alias: {alias!r}')
+    return str(connections[alias].settings_dict['NAME'])
+
+
+def snapshot_taken_on():
+    """When the current snapshot was started, or None without one"""
+    try:
+        stat = os.stat(snapshot_path())
+    except (OSError, ImproperlyConfigured):
+        return None
+    if not stat.st_size:
+        return None
+    return datetime.fromtimestamp(stat.st_mtime, tz=dt_timezone.utc)
+
+
+def snapshot_age():
+    """Age of the current snapshot in seconds, or None without one"""
+    taken_on = snapshot_taken_on()
+    if taken_on is None:
+        return None
+    return max(0.0, time.time() - taken_on.timestamp())
+
+
+def latest_migration(alias):
+    """Id of the last migration applied to ``alias``, or None when unreadable"""
+    try:
+        return MigrationRecorder(connections[alias]).migration_qs.order_by('-id').values_list('id', flat=True).first()
+    except DatabaseError:
+        return None
+
+
+def schema_is_current():
+    """Whether the snapshot was taken after the last migration of the live database"""
+    snapshot = latest_migration(reporting_alias())
+    return snapshot is not None and snapshot == latest_migration(DEFAULT_DB_ALIAS)
+
+
+def reporting_db(page):
+    """Database alias ``page`` should read from.
+
+    The snapshot when ``page`` is listed in LEAVE_REPORTING_PAGES and a
+    snapshot no older than LEAVE_REPORTING_MAX_AGE, taken since the last
+    migration, exists; the live database otherwise, so a stopped schedule or
+    a deploy degrades to live reads, not stale or missing columns.
+    """
+    if page not in reporting_pages():
+        return DEFAULT_DB_ALIAS
+    age = snapshot_age()
+    if age is None or (max_age() is not None and age > max_age()):
+        return DEFAULT_DB_ALIAS
+    if not schema_is_current():
+        return DEFAULT_DB_ALIAS
+    return reporting_alias()
+
+
+def snapshot_info(db):
+    """Template context describing the data source of a page read from ``db``"""
+    if db == DEFAULT_DB_ALIAS:
+        return None
+    return {'taken_on': snapshot_taken_on(), 'age': snapshot_age()}
+
+
+def take_snapshot(pages=-1, sleep=0.0):
+    """Copy the default database to the reporting snapshot.
+
+    ``pages`` per backup step (-1 copies everything in one step, i.e. one
+    short read transaction); between steps other connections can write, and a
+    write from another connection restarts the copy so the result is always
+    consistent. Returns (path, bytes, seconds).
+    """
+    source = connections[DEFAULT_DB_ALIAS]
+    if source.vendor != 'sqlite':
+        raise ImproperlyConfigured('snapshot_reporting_db needs the default database to be SQLite')
+    target = snapshot_path()
+    partial = f'{target}.partial'
+    if os.path.exists(partial):
+        os.remove(partial)
+
+    started = time.time()
+    reader = source.get_new_connection(source.get_connection_params())
+    try:
+        writer = sqlite3.connect(partial)
+        try:
+            reader.backup(writer, pages=pages, sleep=sleep)
+            # A WAL-mode source would hand its journal mode to the copy, and a
+            # stale -wal file left beside the snapshot must never apply to it.
+            writer.execute('PRAGMA journal_mode = DELETE')
+        finally:
+            writer.close()
+    finally:
+        reader.close()
+    elapsed = time.time() - started
+
+    os.utime(partial, (started, started))
+    os.replace(partial, target)
+    # This process' own reporting connection still has the old file open
+    connections[reporting_alias()].close()
+    return target, os.path.getsize(target), elapsed
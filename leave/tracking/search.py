@@ -0,0 +1,138 @@
+# khora/search.py
+import threading
+from bisect import bisect_left, insort
+
+from . import versions
+from .models import CustomUser
+
+VERSION_NAME = 'user-prefix-index'
+
+LOOKUP_FIELDS = ('id', 'username', 'first_name', 'last_name', 'email', 'department', 'role')
+
+
+def _tokens(user):
+    """Lower-cased prefixes a user can be found by"""
+    tokens = {user['username'].lower()}
+    for field in ('first_name', 'last_name', 'department'):
+        value = (user.get(field) or '').strip().lower()
+        if value:
+            tokens.add(value)
+            tokens.update(value.split())
+    full_name = f"{user.get('first_name') or ''} {user.get('last_name') or ''}".strip().lower()
+    if full_name:
+        tokens.add(full_name)
+    email = (user.get('email') or '').strip().lower()
+    if email:
+        tokens.add(email)
+        tokens.add(email.split('@')[0])
+    return tokens
+
+
+class UserPrefixIndex:
+    """Sorted array of (token, user_id) pairs searched with bisect.
+
+    Built lazily on first lookup. The index is per process; a committed
+    CustomUser change bumps a shared version (tracking/versions.py) and patches
+    the index of the process that made it, and every other process rebuilds on
+    its next lookup when it sees the version has moved.
+    """
+
+    def __init__(self):
+        self._entries = []
+        self._tokens_by_user = {}
+        self._users = {}
+        self._built = False
+        self._version = None
+        self._lock = threading.Lock()
+
+    def _build(self):
+        users = {}
+        tokens_by_user = {}
+        entries = []
+        for user in CustomUser.objects.values(*LOOKUP_FIELDS).iterator():
+            users[user['id']] = user
+            tokens = _tokens(user)
+            tokens_by_user[user['id']] = tokens
+            entries.extend((token, user['id']) for token in tokens)
+        entries.sort()
+        self._entries = entries
+        self._tokens_by_user = tokens_by_user
+        self._users = users
+        self._built = True
+
+    def _ensure_current(self):
+        # Read the version before building, so a change committed during the
+        # build leaves the index marked stale rather than current. The read
+        # happens outside the lock; only a rebuild holds it.
+        version = versions.current(VERSION_NAME)
+        if self._built and version == self._version:
+            return
+        with self._lock:
+            if not self._built or version != self._version:
+                self._build()
+                self._version = version
+
+    def _remove(self, user_id):
+        for token in self._tokens_by_user.pop(user_id, ()):
+            i = bisect_left(self._entries, (token, user_id))
+            if i < len(self._entries) and self._entries[i] == (token, user_id):
+                del self._entries[i]
+        self._users.pop(user_id, None)
+
+    def warm(self):
+        """Build the index now instead of on the first lookup"""
+        self._ensure_current()
+        return len(self._users)
+
+    def changed(self, user_id, data=None):
+        """Record a committed change to one user; ``data`` is None for a deletion.
+
+        Bumps the shared version, and patches this process' index in place
+        when no other change slipped in since it was last current.
+        """
+        version = versions.bump(VERSION_NAME)
+        with self._lock:
+            if not self._built or self._version != version - 1:
+                return
+            self._remove(user_id)
+            if data is not None:
+                self._users[user_id] = data
+                self._tokens_by_user[user_id] = _tokens(data)
+                for token in self._tokens_by_user[user_id]:
+                    insort(self._entries, (token, user_id))
+            self._version = version
+
+    def clear(self):
+        with self._lock:
+            self._entries = []
+            self._tokens_by_user = {}
+            self._users = {}
+            self._built = False
+            self._version = None
+
+    def lookup(self, query, limit=10):
+        """Return up to ``limit`` users with a token starting with ``query``.
+
+        Matches come back in token order, so exact and short tokens rank first.
+        """
+        prefix = query.strip().lower()
+        if not prefix:
+            return []
+        self._ensure_current()
+        with self._lock:
+            entries = self._entries
+            seen = set()
+            results = []
+            i = bisect_left(entries, (prefix,))
+            while i < len(entries) and len(results) < limit:
+                token, user_id = entries[i]
+                if not token.startswith(prefix):
+                    break
+                if user_id not in seen:
+                    seen.add(user_id)
+                    results.append(self._users[user_id])
+                i += 1
+        return results
+
+
+user_index = UserPrefixIndex()
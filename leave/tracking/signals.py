@@ -0,0 +1,157 @@
+# khora/signals.py
+from django.db import transaction
+from django.db.models.signals import post_init, pre_save, post_save, pre_delete, post_delete, post_migrate
+from django.dispatch import receiver
+
+from .audit import snapshot, diff, record
+from .balances import apply_usage
+from .calendar_feeds import invalidate_feeds
+from .fts import ensure_reason_index
+from .hierarchy import move
+from .models import CustomUser, LeavePolicy, LeaveRequest, LeaveRequestTombstone, ReportingLine
+from .policies import compiled_policies
+from .search import LOOKUP_FIELDS, user_index
+
+
+@receiver(post_init, sender=CustomUser)
+def remember_department(sender, instance, **kwargs):
+    instance._loaded_department = instance.__dict__.get('department')
+
+
+@receiver(post_save, sender=CustomUser)
+def index_user(sender, instance, update_fields=None, **kwargs):
+    # Logins save last_login only; that does not touch the index
+    if update_fields is None or not set(update_fields).isdisjoint(LOOKUP_FIELDS):
+        user_id, data = instance.pk, {field: getattr(instance, field) for field in LOOKUP_FIELDS}
+        transaction.on_commit(lambda: user_index.changed(user_id, data))
+    if instance.department != instance._loaded_department:
+        invalidate_feeds(instance.pk, [instance.department, instance._loaded_department])
+        instance._loaded_department = instance.department
+
+
+@receiver(post_delete, sender=CustomUser)
+def unindex_user(sender, instance, **kwargs):
+    user_id = instance.pk
+    transaction.on_commit(lambda: user_index.changed(user_id))
+    invalidate_feeds(instance.pk, [instance.department])
+
+
+@receiver(post_init, sender=CustomUser)
+def remember_manager(sender, instance, **kwargs):
+    instance._loaded_manager_id = instance.__dict__.get('manager_id')
+
+
+@receiver(pre_save, sender=CustomUser)
+def reject_reporting_cycle(sender, instance, **kwargs):
+    manager_id = instance.__dict__.get('manager_id')
+    if not manager_id or not instance.pk or manager_id == instance._loaded_manager_id:
+        return
+    if manager_id == instance.pk or ReportingLine.objects.filter(
+        ancestor_id=instance.pk, descendant_id=manager_id,
+    ).exists():
+        raise ValueError(f'{instance.username} cannot report to someone in their own reporting tree')
+
+
+@receiver(post_save, sender=CustomUser)
+def update_reporting_lines(sender, instance, created, **kwargs):
+    # Keep the ReportingLine closure table in step with CustomUser.manager
+    manager_id = instance.__dict__.get('manager_id')
+    if manager_id != instance._loaded_manager_id or (created and manager_id):
+        move(instance.pk, manager_id)
+        instance._loaded_manager_id = manager_id
+
+
+@receiver(pre_delete, sender=CustomUser)
+def detach_reports(sender, instance, **kwargs):
+    # manager is SET_NULL by a bulk UPDATE that sends no signals, so detach the
+    # subtrees here; the deleted user's own rows go with the CASCADE.
+    for report_id in instance.direct_reports.values_list('id', flat=True):
+        move(report_id, None)
+
+
+USAGE_FIELDS = ('user_id', 'leave_type', 'start_date', 'end_date')
+
+
+@receiver(post_init, sender=LeaveRequest)
+def remember_status(sender, instance, **kwargs):
+    instance._loaded_status = instance.__dict__.get('status')
+    instance._loaded_usage = tuple(instance.__dict__.get(field) for field in USAGE_FIELDS)
+
+
+@receiver(post_save, sender=LeaveRequest)
+def track_approved_usage(sender, instance, created, **kwargs):
+    # Keep LeaveBalance.used_days current; close_leave_year recomputes it exactly.
+    was_approved = not created and instance._loaded_status == 'approved'
+    is_approved = instance.status == 'approved'
+    usage = tuple(getattr(instance, field) for field in USAGE_FIELDS)
+    if is_approved != was_approved:
+        apply_usage(instance, 1 if is_approved else -1)
+    elif is_approved and usage != instance._loaded_usage and None not in instance._loaded_usage:
+        # An approved request edited in the admin: move its days from the old
+        # user/type/dates to the new ones
+        apply_usage(LeaveRequest(pk=instance.pk, **dict(zip(USAGE_FIELDS, instance._loaded_usage))), -1)
+        apply_usage(instance, 1)
+    if is_approved or was_approved:
+        invalidate_feeds(instance.user_id, [instance.user.department])
+    instance._loaded_status = instance.status
+    instance._loaded_usage = usage
+
+
+@receiver(post_delete, sender=LeaveRequest)
+def release_approved_usage(sender, instance, origin=None, **kwargs):
+    # When the whole user is being deleted their balances and ledger go with
+    # the cascade; writing new rows for them would fail the user's FK.
+    deleting_user = isinstance(origin, CustomUser) or getattr(origin, 'model', None) is CustomUser
+    if instance._loaded_status == 'approved' and not deleting_user:
+        apply_usage(instance, -1)
+        invalidate_feeds(instance.user_id, [instance.user.department])
+
+
+@receiver(post_delete, sender=LeaveRequest)
+def leave_tombstone(sender, instance, **kwargs):
+    # Lets the changes feed (tracking/sync.py) report hard deletes
+    LeaveRequestTombstone.objects.create(leave_id=instance.pk, user_id=instance.user_id)
+
+
+def _leave_repr(instance):
+    return f'{instance.get_leave_type_display()} {instance.start_date} to {instance.end_date}'
+
+
+@receiver(post_init, sender=LeaveRequest)
+@receiver(post_init, sender=CustomUser)
+def snapshot_for_audit(sender, instance, **kwargs):
+    instance._audit_snapshot = snapshot(instance)
+
+
+@receiver(post_save, sender=LeaveRequest)
+@receiver(post_save, sender=CustomUser)
+def audit_save(sender, instance, created, **kwargs):
+    current = snapshot(instance)
+    changes = diff({} if created else instance._audit_snapshot, current)
+    instance._audit_snapshot = current
+    if not changes:
+        # e.g. the last_login update on every login
+        return
+    object_repr = _leave_repr(instance) if sender is LeaveRequest else None
+    record('create' if created else 'update', instance, changes, object_repr)
+
+
+@receiver(post_delete, sender=LeaveRequest)
+@receiver(post_delete, sender=CustomUser)
+def audit_delete(sender, instance, **kwargs):
+    object_repr = _leave_repr(instance) if sender is LeaveRequest else None
+    record('delete', instance, snapshot(instance), object_repr)
+
+
+@receiver(post_save, sender=LeavePolicy)
+@receiver(post_delete, sender=LeavePolicy)
+def invalidate_policies(sender, **kwargs):
+    # Bumped in the saving transaction, so workers never see the new version
+    # without the change itself
+    compiled_policies.invalidate()
+
+
+@receiver(post_migrate)
+def install_reason_index(sender, using, **kwargs):
+    if sender.name == 'tracking':
+        ensure_reason_index(using)
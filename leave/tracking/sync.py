@@ -0,0 +1,110 @@
+# khora/sync.py
+from datetime import datetime, timedelta
+
+from django.conf import settings
+from django.core import signing
+from django.db.models import F
+from django.utils import timezone
+
+from .models import LeaveRequest, LeaveRequestTombstone
+
+CURSOR_SALT = 'tracking.leave-sync'
+
+CHANGE_FIELDS = (
+    'id', 'user_id', 'leave_type', 'start_date', 'end_date', 'days_count', 'reason',
+    'status', 'admin_comment', 'submitted_on', 'updated_on',
+)
+
+
+class CursorExpired(Exception):
+    """The cursor points before the oldest kept tombstone; the consumer must resync"""
+
+
+def settle_seconds():
+    return getattr(settings, 'LEAVE_SYNC_SETTLE_SECONDS', 5)
+
+
+def tombstone_days():
+    return getattr(settings, 'LEAVE_SYNC_TOMBSTONE_DAYS', 90)
+
+
+def encode_cursor(updated, deleted):
+    return signing.dumps({
+        'u': [updated[0].isoformat(), updated[1]] if updated else None,
+        'd': [deleted[0].isoformat(), deleted[1]],
+    }, salt=CURSOR_SALT, compress=True)
+
+
+def decode_cursor(cursor):
+    """(updated_position, deleted_position), each a (timestamp, id) pair; raises BadSignature"""
+    data = signing.loads(cursor, salt=CURSOR_SALT)
+    try:
+        updated = (datetime.fromisoformat(data['u'][0]), int(data['u'][1])) if data['u'] else None
+        deleted = (datetime.fromisoformat(data['d'][0]), int(data['d'][1]))
+    except (KeyError, TypeError, ValueError, IndexError):
+        raise signing.BadSignature('Malformed cursor')
+    return updated, deleted
+
+
+def _after(queryset, field, position):
+    """Rows strictly after ``position`` in (field, id) order, as an index range scan"""
+    if position is None:
+        return queryset
+    timestamp, row_id = position
+    return queryset.filter(**{f'{field}__gte': timestamp}).exclude(**{field: timestamp, 'id__lte': row_id})
+
+
+def changes_page(cursor=None, limit=500):
+    """One page of the LeaveRequest changes feed.
+
+    Inserts and updates come from the (updated_on, id) index and deletions from
+    the tombstones' (deleted_on, id) index. Rows younger than
+    LEAVE_SYNC_SETTLE_SECONDS are held back, so a transaction that commits
+    late cannot slip in behind a cursor that already moved past it. A first
+    call (no cursor) returns every row; deletions before it are irrelevant
+    to a consumer starting from scratch.
+    """
+    horizon = timezone.now() - timedelta(seconds=settle_seconds())
+    if cursor:
+        updated, deleted = decode_cursor(cursor)
+        if deleted[0] < timezone.now() - timedelta(days=tombstone_days()):
+            raise CursorExpired('Cursor is older than the kept tombstones; start a full sync')
+    else:
+        updated, deleted = None, (horizon, 0)
+
+    changes = list(
+        _after(LeaveRequest.objects.filter(updated_on__lt=horizon), 'updated_on', updated)
+        .order_by('updated_on', 'id')
+        .values(*CHANGE_FIELDS, username=F('user__username'))[:limit + 1]
+    )
+    deletions = list(
+        _after(LeaveRequestTombstone.objects.filter(deleted_on__lt=horizon), 'deleted_on', deleted)
+        .order_by('deleted_on', 'id')
+        .values('id', 'leave_id', 'user_id', 'deleted_on')[:limit + 1]
+    )
+    more_changes, more_deletions = len(changes) > limit, len(deletions) > limit
+    changes, deletions = changes[:limit], deletions[:limit]
+
+    if changes:
+        updated = (changes[-1]['updated_on'], changes[-1]['id'])
+    if more_deletions:
+        deleted = (deletions[-1]['deleted_on'], deletions[-1]['id'])
+    else:
+        # Every tombstone before the horizon has been handed out; moving up to
+        # it keeps a quiet deletion stream from ageing past the retention window.
+        deleted = (horizon, 0)
+    return {
+        'changes': changes,
+        'deletions': [
+            {'id': row['leave_id'], 'user_id': row['user_id'], 'deleted_on': row['deleted_on']}
+            for row in deletions
+        ],
+        'next_cursor': encode_cursor(updated, deleted),
+        'has_more': more_changes or more_deletions,
+    }
+
+
+def prune_tombstones(days=None):
+    cutoff = timezone.now() - timedelta(days=tombstone_days() if days is None else days)
+    deleted, _ = LeaveRequestTombstone.objects.filter(deleted_on__lt=cutoff).delete()
+    return deleted
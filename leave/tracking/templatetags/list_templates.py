@@ -0,0 +1,15 @@
+# khora/templatetags/list_templates.py
+from django import template
+from django.utils.safestring import mark_safe
+
+from tracking.templating import jinja2_enabled, render_list
+
+register = template.Library()
+
+
+@register.simple_tag(takes_context=True)
+def list_include(context, template_name):
+    """{% include %} for list fragments that switches to their Jinja2 twin when enabled"""
+    if not jinja2_enabled():
+        return context.template.engine.get_template(template_name).render(context)
+    return mark_safe(render_list(template_name, context.flatten(), context.get('request')))
@@ -0,0 +1,70 @@
+# khora/templating.py
+import threading
+
+from django.conf import settings
+from django.template import engines
+from django.template.defaultfilters import date as date_filter
+from django.templatetags.static import static
+from django.urls import reverse
+from django.utils.timezone import template_localtime
+
+# The Jinja2 backend for the list fragments is not in TEMPLATES: it is built
+# on first use, so LEAVE_JINJA2_TEMPLATES is read per render and can be
+# switched with override_settings, and projects without jinja2 never import it.
+JINJA2_ENGINE = 'jinja2'
+
+_jinja2 = None
+_jinja2_lock = threading.Lock()
+
+
+def jinja2_enabled():
+    return getattr(settings, 'LEAVE_JINJA2_TEMPLATES', False)
+
+
+def jinja2_engine():
+    """The Jinja2 backend for tracking/jinja2/; raises ImportError without jinja2"""
+    global _jinja2
+    if _jinja2 is None:
+        with _jinja2_lock:
+            if _jinja2 is None:
+                from django.template.backends.jinja2 import Jinja2
+
+                _jinja2 = Jinja2({
+                    'NAME': JINJA2_ENGINE,
+                    'DIRS': [],
+                    'APP_DIRS': True,
+                    'OPTIONS': {
+                        'environment': 'tracking.templating.environment',
+                        'context_processors': settings.TEMPLATES[0].get('OPTIONS', {}).get('context_processors', []),
+                    },
+                })
+    return _jinja2
+
+
+def list_engine():
+    """Engine for the row-heavy list templates: Jinja2 when LEAVE_JINJA2_TEMPLATES is on, else Django"""
+    return jinja2_engine() if jinja2_enabled() else engines['django']
+
+
+def render_list(template_name, context, request=None):
+    """Render one list fragment with the list engine"""
+    return list_engine().get_template(template_name).render(context, request)
+
+
+def url(name, *args, **kwargs):
+    return reverse(name, args=args or None, kwargs=kwargs or None)
+
+
+def date(value, arg=None):
+    # Same output as Django's |date, including the conversion to local time
+    return date_filter(template_localtime(value), arg)
+
+
+def environment(**options):
+    """Jinja2 environment for tracking/jinja2/, with Django's url, static and date"""
+    from jinja2 import Environment
+
+    env = Environment(**options)
+    env.globals.update(url=url, static=static)
+    env.filters.update(date=date)
+    return env
@@ -1,3 +1,883 @@
-from django.test import TestCase
+import re
+import tempfile
+from datetime import date, timedelta
+from pathlib import Path
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.admin.sites import site
+from django.core import signing
+from django.core.exceptions import ValidationError
+from django.core.management import call_command
+from django.db import DatabaseError, transaction
+from django.db.models import Sum
+from django.template import Context, Template
+from django.test import RequestFactory, TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from . import hierarchy, reporting, templating, versions
+from .admin import EstimatedCountPaginator
+from .audit import AuditBuffer, audit_buffer
+from .balances import close_chunk, current_balances
+from .calendar_feeds import feed_token, read_feed_token, rotate_feed_secret
+from .forms import LeaveRequestForm
+from .models import (AuditLogEntry, CustomUser, DayCount, LeaveBalance, LeaveLedgerEntry, LeavePolicy,
+                     LeaveRequest, LeaveRequestTombstone, ReportingLine)
+from .policies import VERSION_NAME as POLICY_VERSION_NAME, Candidate, check_pending, compiled_policies, evaluate
+from .search import VERSION_NAME, UserPrefixIndex, user_index
+from .sync import changes_page, encode_cursor, prune_tombstones
+from .throttling import TokenBucketStore, get_store
+from .warmup import run_warmup
+
+
+class TokenBucketTests(TestCase):
+    def test_burst_then_refill(self):
+        store = TokenBucketStore()
+        with mock.patch('tracking.throttling.time.monotonic', return_value=100.0) as clock:
+            self.assertEqual([store.take('login', 'ip', '1.2.3.4', 3, 1.0) for _ in range(4)],
+                             [True, True, True, False])
+            clock.return_value = 101.0
+            self.assertTrue(store.take('login', 'ip', '1.2.3.4', 3, 1.0))
+            self.assertFalse(store.take('login', 'ip', '1.2.3.4', 3, 1.0))
+        self.assertEqual(store.stats()['counters'], {'login.allowed_ip': 4, 'login.rejected_ip': 2})
+
+    def test_buckets_are_independent_and_bounded(self):
+        store = TokenBucketStore(max_buckets=2)
+        self.assertTrue(store.take('login', 'ip', 'a', 1, 0.001))
+        self.assertFalse(store.take('login', 'ip', 'a', 1, 0.001))
+        self.assertTrue(store.take('login', 'ip', 'b', 1, 0.001))
+        self.assertTrue(store.take('login', 'ip', 'c', 1, 0.001))
+        self.assertEqual(store.stats()['buckets'], 2)
+        # The least recently used bucket was evicted and starts full again
+        self.assertTrue(store.take('login', 'ip', 'a', 1, 0.001))
+
+    @override_settings(LEAVE_THROTTLE_RATES={'login': {'ip': (100, 1.0), 'username': (2, 0.001)}})
+    def test_login_is_rejected_with_429(self):
+        get_store().reset()
+        statuses = [self.client.post('/login/', {'username': 'Mallory', 'password': 'x'}).status_code
+                    for _ in range(3)]
+        self.assertEqual(statuses, [200, 200, 429])
+        # Usernames are bucketed case-insensitively
+        response = self.client.post('/login/', {'username': 'mallory', 'password': 'x'})
+        self.assertEqual(response.status_code, 429)
+        self.assertIn('Retry-After', response)
+
+
+class UserPrefixIndexTests(TestCase):
+    def setUp(self):
+        user_index.clear()
+        self.alice = CustomUser.objects.create_user('alice', 'alice@example.com', 'pw', first_name='Alice',
+                                                    department='Finance')
+
+    def usernames(self, index, query):
+        return [user['username'] for user in index.lookup(query)]
+
+    def test_lookup_matches_prefixes_case_insensitively(self):
+        self.assertEqual(self.usernames(user_index, 'ALI'), ['alice'])
+        self.assertEqual(self.usernames(user_index, 'fin'), ['alice'])
+        self.assertEqual(self.usernames(user_index, 'bob'), [])
+
+    def test_committed_change_reaches_other_processes(self):
+        other = UserPrefixIndex()
+        self.assertEqual(self.usernames(other, 'bob'), [])
+        with self.captureOnCommitCallbacks(execute=True):
+            CustomUser.objects.create_user('bob', 'bob@example.com', 'pw')
+        self.assertEqual(self.usernames(other, 'bob'), ['bob'])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.alice.delete()
+        self.assertEqual(self.usernames(other, 'ali'), [])
+
+    def test_rolled_back_save_is_not_indexed(self):
+        user_index.warm()
+        with self.captureOnCommitCallbacks(execute=True):
+            try:
+                with transaction.atomic():
+                    CustomUser.objects.create_user('carol', 'carol@example.com', 'pw')
+                    raise RuntimeError
+            except RuntimeError:
+                pass
+        self.assertEqual(self.usernames(user_index, 'carol'), [])
+
+    def test_login_does_not_bump_the_version(self):
+        before = versions.current(VERSION_NAME)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.force_login(self.alice)
+            self.alice.save(update_fields=['last_login'])
+        self.assertEqual(versions.current(VERSION_NAME), before)
+
+    def test_version_is_read_outside_the_lock(self):
+        index = UserPrefixIndex()
+        index.warm()
+        read_version = versions.current
+
+        def current(name):
+            self.assertFalse(index._lock.locked())
+            return read_version(name)
+
+        with mock.patch('tracking.search.versions.current', side_effect=current) as read:
+            self.assertEqual(self.usernames(index, 'ali'), ['alice'])
+        read.assert_called_once_with(VERSION_NAME)
+
+
+@override_settings(LEAVE_ENTITLEMENTS={'sick': 12, 'vacation': 15}, LEAVE_CARRY_OVER_LIMITS={'vacation': 5})
+class LeaveBalanceTests(TestCase):
+    def setUp(self):
+        self.user = CustomUser.objects.create_user('emma', 'emma@example.com', 'pw', department='Ops')
+        self.year = timezone.localdate().year
+
+    def approve(self, leave_type, start_date, end_date):
+        return LeaveRequest.objects.create(user=self.user, leave_type=leave_type, start_date=start_date,
+                                           end_date=end_date, reason='r', status='approved')
+
+    def used(self, leave_type, year=None):
+        return LeaveBalance.objects.get(user=self.user, leave_type=leave_type, year=year or self.year).used_days
+
+    def test_dashboard_balances_include_untouched_types(self):
+        self.assertEqual([(b.leave_type, b.remaining_days) for b in current_balances(self.user)],
+                         [('sick', 12), ('vacation', 15)])
+        self.approve('sick', date(self.year, 3, 2), date(self.year, 3, 3))
+        self.assertEqual([(b.leave_type, b.remaining_days) for b in current_balances(self.user)],
+                         [('sick', 10), ('vacation', 15)])
+
+    def test_approval_edit_and_delete_adjust_used_days(self):
+        leave = self.approve('sick', date(self.year, 3, 2), date(self.year, 3, 4))
+        self.assertEqual(self.used('sick'), 3)
+
+        leave = LeaveRequest.objects.get(pk=leave.pk)
+        leave.leave_type, leave.end_date = 'vacation', date(self.year, 3, 5)
+        leave.save()
+        self.assertEqual((self.used('sick'), self.used('vacation')), (0, 4))
+
+        leave.status = 'rejected'
+        leave.save()
+        self.assertEqual(self.used('vacation'), 0)
+
+        leave.status = 'approved'
+        leave.save()
+        leave.delete()
+        self.assertEqual(self.used('vacation'), 0)
+
+    def test_request_spanning_new_year_is_split(self):
+        self.approve('vacation', date(self.year, 12, 30), date(self.year + 1, 1, 2))
+        self.assertEqual((self.used('vacation'), self.used('vacation', self.year + 1)), (2, 2))
+
+    def test_deleting_a_user_with_approved_leave(self):
+        self.approve('sick', date(self.year, 3, 2), date(self.year, 3, 3))
+        self.user.delete()
+        self.assertFalse(LeaveBalance.objects.exists())
+
+    def test_close_leave_year_carries_over_up_to_the_limit(self):
+        last_year = self.year - 1
+        self.approve('vacation', date(last_year, 6, 1), date(last_year, 6, 3))
+        LeaveBalance.objects.filter(user=self.user).update(used_days=99)
+
+        call_command('close_leave_year', year=last_year, workers=1, stdout=mock.MagicMock())
+        call_command('close_leave_year', year=last_year, workers=1, stdout=mock.MagicMock())
+
+        closing = LeaveBalance.objects.get(user=self.user, leave_type='vacation', year=last_year)
+        self.assertEqual((closing.used_days, closing.closed), (3, True))
+        opening = LeaveBalance.objects.get(user=self.user, leave_type='vacation', year=self.year)
+        self.assertEqual(opening.carried_over_days, 5)
+        # Re-running the close replaces its carry-over entry instead of adding another
+        self.assertEqual(LeaveLedgerEntry.objects.filter(user=self.user, kind='carry_over').count(), 1)
+        sick = LeaveBalance.objects.get(user=self.user, leave_type='sick', year=self.year)
+        self.assertEqual(sick.carried_over_days, 0)
+
+    def test_close_leave_year_keeps_the_ledger_reconciled(self):
+        last_year = self.year - 1
+        self.approve('vacation', date(last_year, 6, 1), date(last_year, 6, 3))
+        # Approved without the signals, as before balances were kept: no balance row, no ledger entries
+        leave = LeaveRequest.objects.create(user=self.user, leave_type='sick', start_date=date(last_year, 9, 1),
+                                            end_date=date(last_year, 9, 2), reason='r')
+        LeaveRequest.objects.filter(pk=leave.pk).update(status='approved')
+
+        call_command('close_leave_year', year=last_year, workers=1, stdout=mock.MagicMock())
+
+        self.assertEqual(self.used('sick', last_year), 2)
+        for balance in LeaveBalance.objects.filter(user=self.user):
+            ledger = LeaveLedgerEntry.objects.filter(user=self.user, leave_type=balance.leave_type,
+                                                     year=balance.year).aggregate(total=Sum('days'))['total'] or 0
+            self.assertEqual(ledger, balance.remaining_days, (balance.leave_type, balance.year))
+
+    def test_close_leave_year_keeps_concurrent_usage_of_the_new_year(self):
+        last_year = self.year - 1
+        self.approve('vacation', date(self.year, 3, 2), date(self.year, 3, 3))
+        now, pending = timezone.now, [True]
+
+        def approve_during_close():
+            # close_chunk asks for the time after reading the balances and before writing them
+            if pending:
+                pending.clear()
+                self.approve('vacation', date(self.year, 4, 1), date(self.year, 4, 1))
+            return now()
+
+        with mock.patch('tracking.balances.timezone.now', side_effect=approve_during_close):
+            close_chunk([self.user.pk], last_year, [])
+        self.assertEqual(self.used('vacation'), 3)
+
+    def test_close_leave_year_includes_managers(self):
+        self.user.role = 'manager'
+        self.user.save()
+        last_year = self.year - 1
+        self.approve('vacation', date(last_year, 6, 1), date(last_year, 6, 3))
+
+        call_command('close_leave_year', year=last_year, workers=1, stdout=mock.MagicMock())
+
+        self.assertTrue(LeaveBalance.objects.get(user=self.user, leave_type='vacation', year=last_year).closed)
+        opening = LeaveBalance.objects.get(user=self.user, leave_type='vacation', year=self.year)
+        self.assertEqual(opening.carried_over_days, 5)
+
+
+class CalendarFeedTokenTests(TestCase):
+    def setUp(self):
+        self.user = CustomUser.objects.create_user('finn', 'finn@example.com', 'pw', department='Ops')
+        LeaveRequest.objects.create(user=self.user, leave_type='sick', start_date=date(2026, 3, 2),
+                                    end_date=date(2026, 3, 3), reason='r', status='approved')
+
+    def test_round_trip_and_feed(self):
+        self.assertEqual(read_feed_token(feed_token(self.user, 'user')), ('user', self.user.pk))
+        token = feed_token(self.user, 'department')
+        self.assertEqual(read_feed_token(token), ('department', 'Ops'))
+        response = self.client.get(f'/calendar/{token}.ics')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(b'SUMMARY:finn - Sick Leave', response.content)
+
+    def test_rotating_the_secret_revokes_issued_tokens(self):
+        token = feed_token(self.user, 'user')
+        rotate_feed_secret(self.user)
+        with self.assertRaises(signing.BadSignature):
+            read_feed_token(token)
+        self.assertEqual(self.client.get(f'/calendar/{token}.ics').status_code, 404)
+        self.assertEqual(read_feed_token(feed_token(self.user, 'user')), ('user', self.user.pk))
+
+    def test_department_token_stops_when_the_holder_moves(self):
+        token = feed_token(self.user, 'department')
+        self.user.department = 'HR'
+        self.user.save()
+        with self.assertRaises(signing.BadSignature):
+            read_feed_token(token)
+
+    def test_inactive_holder_and_expired_tokens_are_rejected(self):
+        token = feed_token(self.user, 'user')
+        with override_settings(LEAVE_CALENDAR_TOKEN_MAX_AGE=0), \
+                mock.patch('django.core.signing.time.time', return_value=signing.time.time() + 5):
+            with self.assertRaises(signing.SignatureExpired):
+                read_feed_token(token)
+        CustomUser.objects.filter(pk=self.user.pk).update(is_active=False)
+        with self.assertRaises(signing.BadSignature):
+            read_feed_token(token)
+
+    def test_profile_reset_button(self):
+        self.client.force_login(self.user)
+        token = feed_token(self.user, 'user')
+        self.client.post('/profile/', {'reset_feeds': ''})
+        self.assertEqual(self.client.get(f'/calendar/{token}.ics').status_code, 404)
+
+
+class CalendarFeedCacheTests(TestCase):
+    def setUp(self):
+        self.user = CustomUser.objects.create_user('finn', 'finn@example.com', 'pw', department='Ops')
+        self.leave = LeaveRequest.objects.create(user=self.user, leave_type='sick', start_date=date(2026, 3, 2),
+                                                 end_date=date(2026, 3, 3), reason='r', status='approved')
+        self.url = f"/calendar/{feed_token(self.user, 'user')}.ics"
+
+    def test_matching_etag_gets_not_modified(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        again = self.client.get(self.url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(again.status_code, 304)
+        self.assertEqual(again['ETag'], response['ETag'])
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH='"stale"').status_code, 200)
+
+    def test_leave_change_invalidates_the_feed_on_commit(self):
+        etag = self.client.get(self.url)['ETag']
+        with self.captureOnCommitCallbacks() as callbacks:
+            self.leave.end_date = date(2026, 3, 5)
+            self.leave.save()
+            # Not committed yet: readers still get the cached feed
+            self.assertEqual(self.client.get(self.url)['ETag'], etag)
+        for callback in callbacks:
+            callback()
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertIn(b'DTEND;VALUE=DATE:20260306', response.content)
+
+
+class AuditBufferTests(TestCase):
+    def entry(self, object_id=1):
+        return AuditLogEntry(action='update', model_name='LeaveRequest', object_id=str(object_id),
+                             object_repr='r', changes={})
+
+    def test_entries_join_the_buffer_only_on_commit(self):
+        buffer = AuditBuffer(max_size=50, max_age=60)
+        with self.captureOnCommitCallbacks(execute=True):
+            buffer.add(self.entry())
+            self.assertEqual((buffer.pending(), AuditLogEntry.objects.count()), (0, 0))
+        self.assertEqual((buffer.pending(), AuditLogEntry.objects.count()), (0, 1))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            try:
+                with transaction.atomic():
+                    buffer.add(self.entry(2))
+                    raise RuntimeError
+            except RuntimeError:
+                pass
+        self.assertEqual(AuditLogEntry.objects.count(), 1)
+
+    def test_flushes_when_full(self):
+        buffer = AuditBuffer(max_size=3, max_age=60)
+        self.addCleanup(lambda: buffer._timer and buffer._timer.cancel())
+        buffer._enqueue(self.entry(1))
+        buffer._enqueue(self.entry(2))
+        self.assertEqual((buffer.pending(), AuditLogEntry.objects.count()), (2, 0))
+        buffer._enqueue(self.entry(3))
+        self.assertEqual((buffer.pending(), AuditLogEntry.objects.count()), (0, 3))
+
+    def test_failed_flush_keeps_entries(self):
+        buffer = AuditBuffer(max_size=50, max_age=60)
+        self.addCleanup(lambda: buffer._timer and buffer._timer.cancel())
+        buffer._enqueue(self.entry())
+        with mock.patch.object(AuditLogEntry.objects, 'bulk_create', side_effect=DatabaseError), \
+                self.assertLogs('tracking.audit', 'ERROR'):
+            self.assertEqual(buffer.flush(), 0)
+        self.assertEqual(buffer.pending(), 1)
+        self.assertEqual(buffer.flush(), 1)
+
+    def test_leave_request_changes_are_recorded(self):
+        user = CustomUser.objects.create_user('gail', 'gail@example.com', 'pw')
+        with self.captureOnCommitCallbacks(execute=True):
+            leave = LeaveRequest.objects.create(user=user, leave_type='sick', start_date=date(2026, 3, 2),
+                                                end_date=date(2026, 3, 2), reason='r')
+        with self.captureOnCommitCallbacks(execute=True):
+            leave.status = 'approved'
+            leave.save()
+        audit_buffer.flush()
+        entry = AuditLogEntry.objects.filter(model_name='LeaveRequest', action='update').get()
+        self.assertEqual(entry.changes, {'status': ['pending', 'approved']})
+
+
+class LeaveRequestAdminTests(TestCase):
+    def setUp(self):
+        self.admin = site._registry[LeaveRequest]
+        for username in ('Alice', 'alex', 'bob'):
+            user = CustomUser.objects.create_user(username, f'{username}@example.com', 'pw')
+            LeaveRequest.objects.create(user=user, leave_type='sick', start_date=date(2026, 3, 2),
+                                        end_date=date(2026, 3, 2), reason='dentist')
+
+    def test_username_search_is_a_case_insensitive_prefix(self):
+        request = RequestFactory().get('/')
+        for term in ('al', 'AL'):
+            queryset, _ = self.admin.get_search_results(request, LeaveRequest.objects.all(), term)
+            self.assertEqual(sorted(queryset.values_list('user__username', flat=True)), ['Alice', 'alex'])
+
+    @override_settings(LEAVE_ADMIN_COUNT_LIMIT=2)
+    def test_filtered_counts_stop_at_the_limit(self):
+        capped = EstimatedCountPaginator(LeaveRequest.objects.filter(status='pending'), 100).count
+        self.assertEqual(capped, 2)
+        self.assertEqual(Template('{{ count }}').render(Context({'count': capped})), '2+')
+        exact = EstimatedCountPaginator(LeaveRequest.objects.filter(user__username='bob'), 100).count
+        self.assertEqual(Template('{{ count }}').render(Context({'count': exact})), '1')
+
+
+class TrackingPartialTests(TestCase):
+    def setUp(self):
+        self.admin = CustomUser.objects.create_user('root', 'root@example.com', 'pw', role='admin')
+        user = CustomUser.objects.create_user('hana', 'hana@example.com', 'pw')
+        self.leave = LeaveRequest.objects.create(user=user, leave_type='sick', start_date=date(2026, 3, 2),
+                                                 end_date=date(2026, 3, 3), reason='r')
+        self.client.force_login(self.admin)
+
+    def test_results_partial_renders_stats_and_rows_together(self):
+        response = self.client.get(reverse('admin_tracking'), {'partial': 'results'})
+        self.assertContains(response, 'id="tracking-stats"')
+        self.assertContains(response, 'id="tracking-results"')
+        self.assertContains(response, 'hana')
+        self.assertNotContains(response, '<html')
+
+    def test_rows_partial_renders_only_the_table(self):
+        response = self.client.get(reverse('admin_tracking'), {'partial': 'rows'})
+        self.assertContains(response, 'hana')
+        self.assertNotContains(response, 'stat-card')
+
+    def test_fragment_responses_vary_on_x_partial(self):
+        for response in (
+            self.client.get(reverse('admin_tracking')),
+            self.client.get(reverse('admin_tracking'), headers={'X-Partial': 'stats'}),
+            self.client.get(reverse('admin_users'), headers={'X-Partial': 'cards'}),
+            self.client.post(reverse('update_leave_status', args=[self.leave.id]), {'status': 'approved'},
+                             headers={'X-Partial': 'row'}),
+        ):
+            self.assertIn('X-Partial', response['Vary'])
+
+
+class ReportingHierarchyTests(TestCase):
+    def setUp(self):
+        # ceo <- vp <- lead <- dev, and a separate manager
+        self.ceo = CustomUser.objects.create_user('ceo', 'ceo@example.com', 'pw', role='manager')
+        self.vp = CustomUser.objects.create_user('vp', 'vp@example.com', 'pw', role='manager', manager=self.ceo)
+        self.lead = CustomUser.objects.create_user('lead', 'lead@example.com', 'pw', role='manager', manager=self.vp)
+        self.dev = CustomUser.objects.create_user('dev', 'dev@example.com', 'pw', manager=self.lead)
+        self.other = CustomUser.objects.create_user('other', 'other@example.com', 'pw', role='manager')
+
+    def lines(self):
+        return set(ReportingLine.objects.values_list('ancestor__username', 'descendant__username', 'depth'))
+
+    def test_closure_rows_follow_the_tree(self):
+        self.assertEqual(self.lines(), {
+            ('ceo', 'vp', 1), ('ceo', 'lead', 2), ('ceo', 'dev', 3),
+            ('vp', 'lead', 1), ('vp', 'dev', 2), ('lead', 'dev', 1),
+        })
+        self.assertEqual(hierarchy.subtree(self.vp.pk), {self.vp.pk: 0, self.lead.pk: 1, self.dev.pk: 2})
+
+    def test_moving_a_manager_moves_the_subtree(self):
+        self.lead.manager = self.other
+        self.lead.save()
+        self.assertEqual(self.lines(), {
+            ('ceo', 'vp', 1), ('other', 'lead', 1), ('other', 'dev', 2), ('lead', 'dev', 1),
+        })
+        expected = self.lines()
+        self.assertEqual(hierarchy.rebuild(), len(expected))
+        self.assertEqual(self.lines(), expected)
+
+    def test_cycles_are_rejected(self):
+        self.ceo.manager = self.dev
+        with self.assertRaises(ValidationError):
+            self.ceo.full_clean()
+        with self.assertRaises(ValueError), transaction.atomic():
+            self.ceo.save()
+        self.ceo.manager = self.ceo
+        with self.assertRaises(ValueError), transaction.atomic():
+            self.ceo.save()
+        self.assertEqual(len(self.lines()), 6)
+
+    def test_managers_see_their_subtree_only(self):
+        for user in (self.lead, self.dev, self.other):
+            LeaveRequest.objects.create(user=user, leave_type='sick', start_date=date(2026, 3, 2),
+                                        end_date=date(2026, 3, 2), reason='r')
+        scoped = hierarchy.scope_requests(LeaveRequest.objects.all(), self.vp)
+        self.assertEqual(sorted(scoped.values_list('user__username', flat=True)), ['dev', 'lead'])
+        admin = CustomUser(role='admin')
+        self.assertEqual(hierarchy.scope_requests(LeaveRequest.objects.all(), admin).count(), 3)
+
+    def test_employees_include_managers(self):
+        CustomUser.objects.create_user('root', 'root@example.com', 'pw', role='admin')
+        self.assertEqual(hierarchy.employees(CustomUser.objects.all()).count(), 5)
+        self.assertTrue(self.ceo.is_employee)
+
+
+class LeavePolicyTests(TestCase):
+    def setUp(self):
+        # The version counter rolls back with each test; the compiled cache does not
+        compiled_policies.clear()
+        self.addCleanup(compiled_policies.clear)
+        self.user = CustomUser.objects.create_user('ivan', 'ivan@example.com', 'pw', department='Ops')
+        self.today = timezone.localdate()
+
+    def candidate(self, start_offset, days, leave_type='vacation', user=None):
+        user = user or self.user
+        start_date = self.today + timedelta(days=start_offset)
+        return Candidate(None, user.pk, user.department, leave_type, start_date,
+                         start_date + timedelta(days=days - 1), self.today)
+
+    def test_each_kind_of_rule(self):
+        LeavePolicy.objects.create(name='Length', kind='max_consecutive_days', value=5, leave_type='vacation')
+        self.assertEqual(evaluate(self.candidate(30, 5)), [])
+        self.assertEqual(evaluate(self.candidate(30, 6)), ['Length: at most 5 consecutive days'])
+        self.assertEqual(evaluate(self.candidate(30, 6, leave_type='sick')), [])
+
+        LeavePolicy.objects.create(name='Notice', kind='min_notice_days', value=14, message='Plan ahead')
+        self.assertEqual(evaluate(self.candidate(7, 1)), ['Plan ahead'])
+
+        start = self.today + timedelta(days=60)
+        LeavePolicy.objects.create(name='Freeze', kind='blackout', start_date=start, end_date=start + timedelta(days=2))
+        self.assertEqual(len(evaluate(self.candidate(62, 3))), 1)
+        self.assertEqual(evaluate(self.candidate(63, 3)), [])
+
+    def test_department_capacity_counts_approved_absences(self):
+        LeavePolicy.objects.create(name='Cover', kind='department_capacity', value=1, department='Ops')
+        colleague = CustomUser.objects.create_user('jo', 'jo@example.com', 'pw', department='Ops')
+        start = self.today + timedelta(days=30)
+        LeaveRequest.objects.create(user=colleague, leave_type='vacation', start_date=start, end_date=start,
+                                    reason='r', status='approved')
+        self.assertEqual(len(evaluate(self.candidate(30, 1))), 1)
+        self.assertEqual(evaluate(self.candidate(31, 1)), [])
+        self.assertEqual(evaluate(self.candidate(30, 1, user=colleague)), [])
+
+    def test_changes_bump_the_shared_version(self):
+        self.assertEqual(evaluate(self.candidate(30, 10)), [])
+        before = versions.current(POLICY_VERSION_NAME)
+        policy = LeavePolicy.objects.create(name='Length', kind='max_consecutive_days', value=5)
+        self.assertEqual(versions.current(POLICY_VERSION_NAME), before + 1)
+        self.assertEqual(len(evaluate(self.candidate(30, 10))), 1)
+        policy.active = False
+        policy.save()
+        self.assertEqual(evaluate(self.candidate(30, 10)), [])
+
+    def test_check_pending_and_the_form(self):
+        LeavePolicy.objects.create(name='Length', kind='max_consecutive_days', value=3)
+        start = self.today + timedelta(days=30)
+        long = LeaveRequest.objects.create(user=self.user, leave_type='sick', start_date=start,
+                                           end_date=start + timedelta(days=4), reason='r')
+        LeaveRequest.objects.create(user=self.user, leave_type='sick', start_date=start, end_date=start, reason='r')
+        self.assertEqual(check_pending(), {long.pk: ['Length: at most 3 consecutive days']})
+
+        form = LeaveRequestForm({'leave_type': 'sick', 'start_date': start, 'end_date': start + timedelta(days=4),
+                                 'reason': 'r'}, user=self.user)
+        self.assertFalse(form.is_valid())
+        self.assertEqual(form.non_field_errors(), ['Length: at most 3 consecutive days'])
+
+    def test_editing_a_request_counts_notice_from_its_submission(self):
+        LeavePolicy.objects.create(name='Notice', kind='min_notice_days', value=14)
+        start = self.today + timedelta(days=10)
+        request = LeaveRequest.objects.create(user=self.user, leave_type='vacation', start_date=start,
+                                              end_date=start, reason='r',
+                                              submitted_on=timezone.now() - timedelta(days=7))
+        data = {'leave_type': 'vacation', 'start_date': start, 'end_date': start, 'reason': 'Updated'}
+        self.assertTrue(LeaveRequestForm(data, instance=request, user=self.user).is_valid())
+        self.assertEqual(check_pending(), {})
+        form = LeaveRequestForm(data, user=self.user)
+        self.assertFalse(form.is_valid())
+        self.assertEqual(len(form.non_field_errors()), 1)
+
+
+@override_settings(LEAVE_SYNC_SETTLE_SECONDS=0)
+class LeaveChangesFeedTests(TestCase):
+    def setUp(self):
+        self.user = CustomUser.objects.create_user('kim', 'kim@example.com', 'pw')
+        self.leaves = [
+            LeaveRequest.objects.create(user=self.user, leave_type='sick', start_date=date(2026, 3, day),
+                                        end_date=date(2026, 3, day), reason='r')
+            for day in range(1, 6)
+        ]
+
+    def drain(self, cursor=None, limit=2):
+        """Every page from ``cursor`` on: (change ids, deleted ids, last cursor, page count)"""
+        changes, deletions, pages = [], [], 0
+        while True:
+            page = changes_page(cursor, limit=limit)
+            changes += [row['id'] for row in page['changes']]
+            deletions += [row['id'] for row in page['deletions']]
+            cursor, pages = page['next_cursor'], pages + 1
+            if not page['has_more']:
+                return changes, deletions, cursor, pages
+
+    def test_cursor_pages_through_every_change_once(self):
+        changes, deletions, cursor, pages = self.drain()
+        self.assertEqual(changes, [leave.id for leave in self.leaves])
+        self.assertEqual((deletions, pages), ([], 3))
+        self.assertEqual(self.drain(cursor)[:2], ([], []))
+
+        self.leaves[1].status = 'approved'
+        self.leaves[1].save()
+        changes, _, cursor, _ = self.drain(cursor)
+        self.assertEqual(changes, [self.leaves[1].id])
+        self.assertEqual(changes_page(cursor)['changes'], [])
+
+    def test_deletions_appear_as_tombstones(self):
+        cursor = self.drain()[2]
+        deleted_id = self.leaves[2].id
+        self.leaves[2].delete()
+        changes, deletions, _, _ = self.drain(cursor)
+        self.assertEqual((changes, deletions), ([], [deleted_id]))
+
+    @override_settings(LEAVE_SYNC_SETTLE_SECONDS=60)
+    def test_unsettled_rows_are_held_back(self):
+        self.assertEqual(changes_page()['changes'], [])
+
+    def test_endpoint_rejects_bad_and_expired_cursors(self):
+        admin = CustomUser.objects.create_user('root', 'root@example.com', 'pw', role='admin')
+        self.client.force_login(admin)
+        url = reverse('leave_changes')
+        self.assertEqual(len(self.client.get(url).json()['changes']), 5)
+        self.assertEqual(self.client.get(url, {'cursor': 'tampered'}).status_code, 400)
+        stale = encode_cursor(None, (timezone.now() - timedelta(days=91), 0))
+        self.assertEqual(self.client.get(url, {'cursor': stale}).status_code, 410)
+        self.client.force_login(self.user)
+        self.assertEqual(self.client.get(url).status_code, 403)
+
+    def test_prune_tombstones(self):
+        old_id, recent_id = self.leaves[0].id, self.leaves[1].id
+        self.leaves[0].delete()
+        self.leaves[1].delete()
+        LeaveRequestTombstone.objects.filter(leave_id=old_id).update(deleted_on=timezone.now() - timedelta(days=100))
+        self.assertEqual(prune_tombstones(), 1)
+        self.assertEqual(list(LeaveRequestTombstone.objects.values_list('leave_id', flat=True)), [recent_id])
+
+
+@override_settings(LEAVE_REPORTING_PAGES=['export'], LEAVE_REPORTING_MAX_AGE=3600)
+class ReportingSnapshotTests(TestCase):
+    databases = {'default', 'reporting'}
+
+    def choose(self, page='export', age=60.0, migrations=None):
+        migrations = migrations or {'default': 42, 'reporting': 42}
+        with mock.patch.object(reporting, 'snapshot_age', return_value=age), \
+                mock.patch.object(reporting, 'latest_migration', side_effect=migrations.get):
+            return reporting.reporting_db(page)
+
+    def test_only_listed_pages_with_a_fresh_current_snapshot_use_it(self):
+        self.assertEqual(self.choose(), 'reporting')
+        self.assertEqual(self.choose(page='tracking'), 'default')
+        self.assertEqual(self.choose(age=None), 'default')
+        self.assertEqual(self.choose(age=7200.0), 'default')
+
+    def test_snapshot_from_before_a_migration_is_not_used(self):
+        self.assertEqual(self.choose(migrations={'default': 43, 'reporting': 42}), 'default')
+        self.assertEqual(self.choose(migrations={'default': 42, 'reporting': None}), 'default')
+
+    def test_latest_migration_reads_the_recorder(self):
+        self.assertIsNotNone(reporting.latest_migration('default'))
+
+
+class ReportingPagesTests(TransactionTestCase):
+    # Committed rows, so the snapshot connection can read them
+    databases = {'default', 'reporting'}
+
+    def test_reports_show_the_snapshot_and_action_pages_stay_live(self):
+        admin = CustomUser.objects.create_user('root', 'root@example.com', 'pw', role='admin')
+        employee = CustomUser.objects.create_user('mia', 'mia@example.com', 'pw')
+        note = 'Figures from the reporting snapshot'
+        with override_settings(LEAVE_REPORTING_PAGES=['home', 'history']), \
+                mock.patch.object(reporting, 'snapshot_age', return_value=60.0), \
+                mock.patch.object(reporting, 'snapshot_taken_on', return_value=timezone.now()):
+            self.client.force_login(admin)
+            self.assertContains(self.client.get(reverse('admin_home')), note)
+            self.assertContains(self.client.get(reverse('leave_history')), note)
+            self.assertNotContains(self.client.get(reverse('admin_tracking')), note)
+            self.assertNotContains(self.client.get(reverse('admin_users')), note)
+            self.client.force_login(employee)
+            self.assertNotContains(self.client.get(reverse('leave_history')), note)
+
+
+class ProfilingTests(TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = Path(directory.name)
+        settings_override = override_settings(LEAVE_PROFILE_DIR=self.directory, LEAVE_PROFILE_MAX_REPORTS=2)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.admin = CustomUser.objects.create_user('root', 'root@example.com', 'pw', role='admin')
+
+    def profile(self):
+        return self.client.get(reverse('profile'), {'_profile': '1'})
+
+    def test_only_admins_are_profiled(self):
+        self.profile()
+        self.client.force_login(CustomUser.objects.create_user('lena', 'lena@example.com', 'pw'))
+        self.assertNotIn('X-Profile-Report', self.profile())
+        self.assertEqual(list(self.directory.iterdir()), [])
+
+    def test_ring_keeps_the_newest_reports(self):
+        self.client.force_login(self.admin)
+        urls = [self.profile()['X-Profile-Report'] for _ in range(3)]
+        self.assertEqual(len(list(self.directory.glob('*.json'))), 2)
+        self.assertEqual(len(list(self.directory.glob('*.prof'))), 2)
+        self.assertEqual(self.client.get(urls[-1]).status_code, 200)
+
+    def test_download_returns_the_stored_profile(self):
+        self.client.force_login(self.admin)
+        report_id = self.profile()['X-Profile-Report'].rstrip('/').rsplit('/', 1)[1]
+        response = self.client.get(reverse('profile_report_download', args=[report_id]))
+        self.assertEqual(b''.join(response.streaming_content), (self.directory / f'{report_id}.prof').read_bytes())
+
+    def test_path_like_ids_are_rejected(self):
+        self.client.force_login(self.admin)
+        report_id = self.profile()['X-Profile-Report'].rstrip('/').rsplit('/', 1)[1]
+        for bad_id in ('..', f'{report_id}.json', f'..{report_id}', 'profiles'):
+            self.assertEqual(self.client.get(reverse('profile_report', args=[bad_id])).status_code, 404)
+            self.assertEqual(self.client.get(reverse('profile_report_download', args=[bad_id])).status_code, 404)
+
+    def test_a_failed_save_does_not_fail_the_request(self):
+        self.client.force_login(self.admin)
+        with mock.patch('tracking.profiling.save_report', side_effect=OSError('disk full')), \
+                self.assertLogs('tracking.profiling', 'ERROR'):
+            response = self.profile()
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('X-Profile-Report', response)
+
+
+class PendingQueueTests(TestCase):
+    def setUp(self):
+        self.admin = CustomUser.objects.create_user('root', 'root@example.com', 'pw', role='admin')
+        self.manager = CustomUser.objects.create_user('nora', 'nora@example.com', 'pw', role='manager')
+        self.report = CustomUser.objects.create_user('omar', 'omar@example.com', 'pw', department='Ops',
+                                                     manager=self.manager)
+        self.outsider = CustomUser.objects.create_user('pia', 'pia@example.com', 'pw', department='HR')
+        start = timezone.localdate() + timedelta(days=30)
+
+        def leave(user, offset, leave_type='vacation', status='pending'):
+            day = start + timedelta(days=offset)
+            return LeaveRequest.objects.create(user=user, leave_type=leave_type, start_date=day, end_date=day,
+                                               reason='r', status=status)
+
+        self.late = leave(self.report, 9)
+        self.soon = leave(self.outsider, 1)
+        self.sick = leave(self.report, 3, leave_type='sick')
+        leave(self.report, 0, status='approved')
+
+    def queue(self, user, **params):
+        self.client.force_login(user)
+        return [row['id'] for row in self.client.get(reverse('pending_queue'), params).context['rows']]
+
+    def test_soonest_first_and_filters(self):
+        self.assertEqual(self.queue(self.admin), [self.soon.id, self.sick.id, self.late.id])
+        self.assertEqual(self.queue(self.admin, leave_type='sick'), [self.sick.id])
+        self.assertEqual(self.queue(self.admin, department='HR'), [self.soon.id])
+
+    def test_managers_see_their_reports_only(self):
+        self.assertEqual(self.queue(self.manager), [self.sick.id, self.late.id])
+        self.client.force_login(self.report)
+        self.assertRedirects(self.client.get(reverse('pending_queue')), reverse('user_dashboard'),
+                             fetch_redirect_response=False)
+
+    def test_decisions_return_to_the_queue_but_never_off_site(self):
+        self.client.force_login(self.admin)
+        url = reverse('update_leave_status', args=[self.soon.id])
+        back = reverse('pending_queue') + '?department=HR'
+        response = self.client.post(url, {'status': 'approved', 'next': back})
+        self.assertRedirects(response, back, fetch_redirect_response=False)
+        response = self.client.post(url, {'status': 'rejected', 'next': 'https://evil.example.com/'})
+        self.assertRedirects(response, reverse('admin_home'), fetch_redirect_response=False)
+
+
+class DaysCountTests(TestCase):
+    RANGES = [
+        (date(2026, 3, 2), date(2026, 3, 2)),
+        (date(2026, 2, 27), date(2026, 3, 2)),
+        (date(2025, 12, 29), date(2026, 1, 3)),
+        (date(2024, 2, 28), date(2024, 3, 1)),
+    ]
+
+    def setUp(self):
+        self.user = CustomUser.objects.create_user('quinn', 'quinn@example.com', 'pw')
+        self.leaves = [
+            LeaveRequest.objects.create(user=self.user, leave_type='vacation', start_date=start, end_date=end,
+                                        reason='r', status='approved')
+            for start, end in self.RANGES
+        ]
+
+    def test_generated_column_counts_inclusive_days(self):
+        stored = dict(LeaveRequest.objects.values_list('id', 'days_count'))
+        computed = dict(LeaveRequest.objects.values_list('id', DayCount('start_date', 'end_date')))
+        for leave, (start, end) in zip(self.leaves, self.RANGES):
+            self.assertEqual(stored[leave.id], (end - start).days + 1, (start, end))
+            self.assertEqual(computed[leave.id], (end - start).days + 1, (start, end))
+
+    def test_tracking_length_filters_and_sort(self):
+        self.client.force_login(CustomUser.objects.create_user('root', 'root@example.com', 'pw', role='admin'))
+
+        def days(**params):
+            rows = self.client.get(reverse('admin_tracking'), params).context['leave_requests']
+            return [row['days_count'] for row in rows]
+
+        self.assertEqual(days(sort='longest'), [6, 4, 3, 1])
+        self.assertEqual(days(sort='shortest'), [1, 3, 4, 6])
+        self.assertEqual(days(min_days=3, max_days=4, sort='longest'), [4, 3])
+        self.assertEqual(days(min_days='x', sort='shortest'), [1, 3, 4, 6])
+
+    def test_admin_users_sums_approved_days(self):
+        LeaveRequest.objects.create(user=self.user, leave_type='sick', start_date=date(2026, 5, 4),
+                                    end_date=date(2026, 5, 8), reason='r')
+        self.client.force_login(CustomUser.objects.create_user('root', 'root@example.com', 'pw', role='admin'))
+        users = {user.username: user for user in self.client.get(reverse('admin_users')).context['users']}
+        self.assertEqual((users['quinn'].days_taken, users['quinn'].total_requests), (14, 5))
+
+
+class Jinja2ListTemplateTests(TestCase):
+    def setUp(self):
+        self.admin = CustomUser.objects.create_user('root', 'root@example.com', 'pw', role='admin')
+        user = CustomUser.objects.create_user('rosa', 'rosa@example.com', 'pw', department='Ops', phone='555')
+        for status, comment in (('pending', ''), ('approved', 'Enjoy <3'), ('rejected', 'Busy week')):
+            LeaveRequest.objects.create(user=user, leave_type='vacation', start_date=date(2026, 3, 2),
+                                        end_date=date(2026, 3, 4), reason='Trip & "rest"', status=status,
+                                        admin_comment=comment)
+        self.client.force_login(self.admin)
+
+    def render(self, url, params, enabled):
+        with override_settings(LEAVE_JINJA2_TEMPLATES=enabled):
+            html = self.client.get(url, params).content.decode()
+        # csrf tokens differ per render; whitespace and the entities for quotes
+        # (markupsafe writes &#34; and &#39;) differ by engine
+        html = re.sub(r'name="csrfmiddlewaretoken" value="[^"]*"', '', html)
+        html = html.replace('&#34;', '&quot;').replace('&#39;', '&#x27;')
+        return re.sub(r'\s+', ' ', html).strip()
+
+    def test_twins_render_the_same_html(self):
+        pages = [
+            (reverse('admin_tracking'), {'partial': 'rows'}),
+            (reverse('admin_users'), {'partial': 'cards'}),
+            (reverse('leave_history'), {}),
+        ]
+        for url, params in pages:
+            django_html = self.render(url, params, False)
+            self.assertIn('rosa', django_html)
+            self.assertEqual(self.render(url, params, True), django_html, url)
+
+    def test_setting_switches_the_engine_per_render(self):
+        with mock.patch('tracking.templating.jinja2_engine', wraps=templating.jinja2_engine) as engine:
+            self.render(reverse('admin_tracking'), {'partial': 'rows'}, False)
+            self.assertFalse(engine.called)
+            self.render(reverse('admin_tracking'), {'partial': 'rows'}, True)
+            self.assertTrue(engine.called)
+
+
+class WarmupTests(TestCase):
+    def setUp(self):
+        user_index.clear()
+        compiled_policies.clear()
+        CustomUser.objects.create_user('rosa', 'rosa@example.com', 'pw', department='Ops')
+        LeavePolicy.objects.create(name='Length', kind='max_consecutive_days', value=5)
+
+    def tearDown(self):
+        user_index.clear()
+        compiled_policies.clear()
+
+    def test_every_step_reports_warmed(self):
+        counts = {step: count for step, count, seconds in run_warmup()}
+        self.assertEqual(list(counts), ['templates', 'urls', 'caches', 'policies'])
+        self.assertTrue(all(counts.values()), counts)
+        self.assertEqual(counts['caches'], 1)
+        self.assertEqual(counts['policies'], 1)
+        # Both caches are current, so using them reads only their version rows
+        with self.assertNumQueries(2):
+            user_index.lookup('ros')
+            compiled_policies.get()
+
+
+class QueryCountTests(TestCase):
+    # Pinned per page and the same at both data sizes, so an N+1 shows up as a
+    # count that grows with the rows
+    PAGES = {'admin_tracking': 4, 'leave_history': 4, 'admin_requests': 6}
+
+    def setUp(self):
+        compiled_policies.clear()
+        self.addCleanup(compiled_policies.clear)
+        get_store().reset()
+        self.admin = CustomUser.objects.create_user('root', 'root@example.com', 'pw', role='admin')
+        LeavePolicy.objects.create(name='Length', kind='max_consecutive_days', value=2)
+        self.client.force_login(self.admin)
+        self.employees = 0
+
+    def add_employees(self, count):
+        for i in range(self.employees, self.employees + count):
+            user = CustomUser.objects.create_user(f'emp{i}', f'emp{i}@example.com', 'pw', department=f'Dept {i % 3}')
+            for status in ('pending', 'approved', 'rejected'):
+                LeaveRequest.objects.create(user=user, leave_type='vacation', start_date=date(2026, 3, 2),
+                                            end_date=date(2026, 3, 4 + i % 2), reason='r', status=status)
+        self.employees += count
+
+    def assert_pages(self, rows):
+        for name, queries in self.PAGES.items():
+            url = reverse(name)
+            self.client.get(url)  # fills the process caches
+            with self.subTest(name, rows=rows), self.assertNumQueries(queries):
+                response = self.client.get(url)
+            self.assertContains(response, f'emp{self.employees - 1}')
+
+    def test_query_counts_do_not_grow_with_the_data(self):
+        self.add_employees(3)
+        self.assert_pages(9)
+        self.add_employees(27)
+        self.assert_pages(90)
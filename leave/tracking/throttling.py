@@ -0,0 +1,137 @@
+# khora/throttling.py
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+
+from django.conf import settings
+from django.contrib import messages
+from django.core.cache import caches
+from django.shortcuts import render
+
+# capacity = burst size, rate = tokens refilled per second
+DEFAULT_RATES = {
+    'login': {'ip': (20, 20 / 60.0), 'username': (5, 5 / 300.0)},
+    'signup': {'ip': (5, 5 / 600.0), 'username': (3, 3 / 600.0)},
+    'forgot_password': {'ip': (5, 5 / 600.0), 'username': (3, 3 / 900.0)},
+}
+
+MAX_LOCAL_BUCKETS = 10000
+
+
+class TokenBucketStore:
+    """Token buckets kept in process, optionally backed by a shared Django cache"""
+
+    def __init__(self, cache_alias=None, max_buckets=MAX_LOCAL_BUCKETS):
+        self.cache_alias = cache_alias
+        self.max_buckets = max_buckets
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+        self.counters = {}
+
+    def _count(self, scope, outcome):
+        key = (scope, outcome)
+        self.counters[key] = self.counters.get(key, 0) + 1
+
+    def _take_local(self, key, capacity, rate, now):
+        tokens, stamp = self._buckets.pop(key, (capacity, now))
+        tokens = min(capacity, tokens + (now - stamp) * rate)
+        allowed = tokens >= 1
+        if allowed:
+            tokens -= 1
+        self._buckets[key] = (tokens, now)
+        while len(self._buckets) > self.max_buckets:
+            self._buckets.popitem(last=False)
+        return allowed
+
+    def _take_shared(self, key, capacity, rate, now):
+        # Read-modify-write on the shared cache is not atomic, so a burst spread
+        # across workers may slip a few extra requests through. Good enough here.
+        cache = caches[self.cache_alias]
+        cache_key = f'throttle:{key}'
+        tokens, stamp = cache.get(cache_key, (capacity, now))
+        tokens = min(capacity, tokens + (now - stamp) * rate)
+        allowed = tokens >= 1
+        if allowed:
+            tokens -= 1
+        cache.set(cache_key, (tokens, now), timeout=int(capacity / rate) + 1)
+        return allowed
+
+    def take(self, scope, kind, ident, capacity, rate):
+        """Consume one token for (scope, kind, ident); return False when empty"""
+        key = f'{scope}:{kind}:{ident}'
+        now = time.monotonic() if self.cache_alias is None else time.time()
+        with self._lock:
+            if self.cache_alias is None:
+                allowed = self._take_local(key, capacity, rate, now)
+            else:
+                allowed = self._take_shared(key, capacity, rate, now)
+            self._count(scope, f'allowed_{kind}' if allowed else f'rejected_{kind}')
+        return allowed
+
+    def stats(self):
+        with self._lock:
+            return {
+                'buckets': len(self._buckets),
+                'counters': {f'{scope}.{outcome}': n for (scope, outcome), n in sorted(self.counters.items())},
+            }
+
+    def reset(self):
+        with self._lock:
+            self._buckets.clear()
+            self.counters.clear()
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_store():
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = TokenBucketStore(cache_alias=getattr(settings, 'LEAVE_THROTTLE_CACHE', None))
+    return _store
+
+
+def get_rates(scope):
+    rates = getattr(settings, 'LEAVE_THROTTLE_RATES', {})
+    return rates.get(scope, DEFAULT_RATES[scope])
+
+
+def client_ip(request):
+    return request.META.get('REMOTE_ADDR') or 'unknown'
+
+
+def throttle(scope, template, identity_field, context=None):
+    """Reject over-limit POSTs before the view does any hashing or queries.
+
+    Buckets are kept per client IP and per submitted identity
+    (username or email, read from ``identity_field``). ``context`` is an
+    optional callable returning the context for the rejection page.
+    """
+    def decorator(view_func):
+        @wraps(view_func)
+        def wrapper(request, *args, **kwargs):
+            if request.method != 'POST' or not getattr(settings, 'LEAVE_THROTTLE_ENABLED', True):
+                return view_func(request, *args, **kwargs)
+
+            store = get_store()
+            rates = get_rates(scope)
+            checks = [('ip', client_ip(request))]
+            identity = (request.POST.get(identity_field) or '').strip().lower()
+            if identity:
+                checks.append(('username', identity))
+
+            for kind, ident in checks:
+                capacity, rate = rates[kind]
+                if not store.take(scope, kind, ident, capacity, rate):
+                    messages.error(request, 'Too many attempts. Please wait a few minutes and try again.')
+                    response = render(request, template, context() if context else {}, status=429)
+                    response['Retry-After'] = str(int(1 / rate) + 1)
+                    return response
+
+            return view_func(request, *args, **kwargs)
+        return wrapper
+    return decorator
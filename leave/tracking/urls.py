@@ -12,14 +12,23 @@ urlpatterns = [
     path('dashboard/admin/', views.admin_dashboard, name='admin_dashboard'),
     path('dashboard/admin/home/', views.admin_home, name='admin_home'),
     path('dashboard/admin/requests/', views.admin_requests, name='admin_requests'),
+    path('dashboard/admin/pending/', views.pending_queue, name='pending_queue'),
     path('dashboard/admin/tracking/', views.admin_tracking, name='admin_tracking'),
     path('dashboard/admin/users/', views.admin_users, name='admin_users'),
+    path('dashboard/admin/users/lookup/', views.user_lookup, name='user_lookup'),
+    path('dashboard/admin/throttle-stats/', views.throttle_stats, name='throttle_stats'),
+    path('dashboard/admin/audit/', views.audit_log, name='audit_log'),
+    path('dashboard/admin/profiles/', views.profile_reports, name='profile_reports'),
+    path('dashboard/admin/profiles/<str:report_id>/', views.profile_report, name='profile_report'),
+    path('dashboard/admin/profiles/<str:report_id>/download/', views.profile_report_download, name='profile_report_download'),
     path('dashboard/admin/create/', views.create_admin, name='create_admin'),
     path('leave/submit/', views.submit_leave, name='submit_leave'),
     path('leave/edit/<int:leave_id>/', views.edit_leave, name='edit_leave'),
     path('leave/delete/<int:leave_id>/', views.delete_leave, name='delete_leave'),
     path('leave/history/', views.leave_history, name='leave_history'),
     path('leave/update/<int:leave_id>/', views.update_leave_status, name='update_leave_status'),
+    path('calendar/<str:token>.ics', views.calendar_feed, name='calendar_feed'),
+    path('api/leave/changes/', views.leave_changes, name='leave_changes'),
     path('forgot-password/', views.forgot_password, name='forgot_password'),
     path('reset-password/<uidb64>/<token>/', views.reset_password, name='reset_password'),
 ]
\ No newline at end of file
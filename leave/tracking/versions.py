@@ -0,0 +1,21 @@
+# khora/versions.py
+from django.db.models import F
+
+from .models import CacheVersion
+
+# Per-process caches (the user prefix index, compiled leave policies) and the
+# calendar feed cache keys check a counter in the database before use and
+# rebuild when it moved. The database is the one store every worker shares
+# whatever CACHES says; the check is a single primary-key read.
+
+
+def current(name):
+    return CacheVersion.objects.filter(name=name).values_list('version', flat=True).first() or 0
+
+
+def bump(name):
+    """Advance ``name`` and return the new version"""
+    if not CacheVersion.objects.filter(name=name).update(version=F('version') + 1):
+        CacheVersion.objects.get_or_create(name=name)
+        CacheVersion.objects.filter(name=name).update(version=F('version') + 1)
+    return current(name)
@@ -5,21 +5,40 @@ from django.contrib.auth.decorators import login_required
 from django.contrib import messages
 from django.contrib.auth.forms import PasswordResetForm
 from django.contrib.auth.tokens import default_token_generator
-from django.utils.http import urlsafe_base64_encode, urlsafe_base64_decode
+from django.utils.http import urlsafe_base64_encode, urlsafe_base64_decode, http_date, url_has_allowed_host_and_scheme
 from django.utils.encoding import force_bytes, force_str
 from django.template.loader import render_to_string
 from django.core.mail import send_mail
 from django.conf import settings
-from django.db.models import Q
+from django.http import JsonResponse, HttpResponse, Http404, FileResponse
+from django.core import signing
+from django.utils.cache import get_conditional_response
+from django.views.decorators.http import require_GET
+from django.views.decorators.vary import vary_on_headers
+from django.db import DEFAULT_DB_ALIAS
+from django.db.models import Q, Count, Sum
 from django.utils import timezone
 from datetime import datetime, timedelta
-from .models import CustomUser, LeaveRequest
+from django.core.paginator import Paginator
+from .models import CustomUser, LeaveRequest, AuditLogEntry
 from .forms import SignUpForm, LeaveRequestForm, LeaveApprovalForm
+from .throttling import throttle, get_store
+from .search import user_index
+from .balances import current_balances
+from .calendar_feeds import feed_token, read_feed_token, get_feed, rotate_feed_secret
+from .audit import audit_buffer
+from .profiling import list_reports, load_report, report_file
+from .hierarchy import can_review, employees, scope_requests, scope_users
+from .policies import check_pending
+from .sync import changes_page, CursorExpired
+from .templating import render_list
+from .reporting import reporting_db, snapshot_info
 
 def home(request):
     """Home page view"""
     return render(request, 'home.html')
 
+@throttle('signup', 'signup.html', 'username', context=lambda: {'form': SignUpForm()})
 def signup_view(request):
     """User registration view"""
     if request.user.is_authenticated:
@@ -37,6 +56,7 @@ def signup_view(request):
     
     return render(request, 'signup.html', {'form': form})
 
+@throttle('login', 'login.html', 'username')
 def login_view(request):
     """User login view"""
     if request.user.is_authenticated:
@@ -68,6 +88,11 @@ def logout_view(request):
 @login_required
 def profile_view(request):
     """User profile view"""
+    if request.method == 'POST' and 'reset_feeds' in request.POST:
+        rotate_feed_secret(request.user)
+        messages.success(request, 'Calendar links reset. The old links no longer work.')
+        return redirect('profile')
+    
     if request.method == 'POST':
         user = request.user
         user.email = request.POST.get('email', user.email)
@@ -79,7 +104,10 @@ def profile_view(request):
         messages.success(request, 'Profile updated successfully!')
         return redirect('profile')
     
-    return render(request, 'profile.html')
+    context = {'user_feed_token': feed_token(request.user, 'user')}
+    if request.user.department:
+        context['department_feed_token'] = feed_token(request.user, 'department')
+    return render(request, 'profile.html', context)
 
 @login_required
 def create_admin(request):
@@ -132,6 +160,7 @@ def user_dashboard(request):
     
     context = {
         'leave_requests': leave_requests[:5],
+        'balances': current_balances(request.user),
         'pending_count': pending_count,
         'approved_count': approved_count,
         'rejected_count': rejected_count,
@@ -150,22 +179,74 @@ def admin_dashboard(request):
 @login_required
 def admin_requests(request):
     """Admin requests dashboard (old dashboard functionality)"""
-    if request.user.role != 'admin':
+    if not can_review(request.user):
         return redirect('user_dashboard')
     
-    leave_requests = LeaveRequest.objects.all()
-    pending_requests = leave_requests.filter(status='pending')
-    approved_requests = leave_requests.filter(status='approved')
-    rejected_requests = leave_requests.filter(status='rejected')
+    # One projected query; split by status in Python instead of three querysets.
+    # Managers only see their reporting subtree.
+    scoped = scope_requests(LeaveRequest.objects.all(), request.user)
+    rows = scoped.rows('reason')
+    pending_requests = [row for row in rows if row['status'] == 'pending']
+    
+    # Flag pending requests that break a leave policy, checked in one batch
+    violations = check_pending(scoped)
+    for row in pending_requests:
+        row['policy_violations'] = violations.get(row['id'], [])
+    approved_requests = [row for row in rows if row['status'] == 'approved']
+    rejected_requests = [row for row in rows if row['status'] == 'rejected']
     
     context = {
         'pending_requests': pending_requests,
         'approved_requests': approved_requests,
         'rejected_requests': rejected_requests,
-        'total_users': CustomUser.objects.filter(role='user').count(),
+        'pending_count': len(pending_requests),
+        'approved_count': len(approved_requests),
+        'rejected_count': len(rejected_requests),
+        'total_users': scope_users(employees(CustomUser.objects.all()), request.user).count(),
     }
     return render(request, 'admin/dashboard.html', context)
 
+@login_required
+def pending_queue(request):
+    """Pending requests, the ones starting soonest first"""
+    if not can_review(request.user):
+        return redirect('user_dashboard')
+    
+    # Reads the partial (start_date, id) index on pending rows only, so the
+    # cost follows the size of the queue, not of the whole history
+    queue = scope_requests(LeaveRequest.objects.filter(status='pending'), request.user).order_by('start_date', 'id')
+    leave_type = request.GET.get('leave_type')
+    department = request.GET.get('department')
+    if leave_type:
+        queue = queue.filter(leave_type=leave_type)
+    if department:
+        queue = queue.filter(user__department=department)
+    
+    paginator = Paginator(queue, 50)
+    page = paginator.get_page(request.GET.get('page'))
+    rows = page.object_list.rows('reason')
+    
+    # Policy checks and urgency for the visible page only
+    violations = check_pending(LeaveRequest.objects.filter(id__in=[row['id'] for row in rows]))
+    today = timezone.localdate()
+    for row in rows:
+        row['policy_violations'] = violations.get(row['id'], [])
+        row['starts_in'] = (row['start_date'] - today).days
+    
+    query = request.GET.copy()
+    query.pop('page', None)
+    
+    departments = (scope_users(CustomUser.objects.exclude(department=''), request.user)
+                   .values_list('department', flat=True).distinct().order_by('department'))
+    context = {
+        'page': page,
+        'rows': rows,
+        'query_string': query.urlencode(),
+        'leave_type_choices': LeaveRequest.LEAVE_TYPE_CHOICES,
+        'departments': [name for name in departments if name],
+    }
+    return render(request, 'admin/pending_queue.html', context)
+
 @login_required
 def submit_leave(request):
     """Submit new leave request"""
@@ -174,7 +255,7 @@ def submit_leave(request):
         return redirect('admin_dashboard')
     
     if request.method == 'POST':
-        form = LeaveRequestForm(request.POST)
+        form = LeaveRequestForm(request.POST, user=request.user)
         if form.is_valid():
             leave_request = form.save(commit=False)
             leave_request.user = request.user
@@ -182,7 +263,7 @@ def submit_leave(request):
             messages.success(request, 'Leave request submitted successfully!')
             return redirect('user_dashboard')
     else:
-        form = LeaveRequestForm()
+        form = LeaveRequestForm(user=request.user)
     
     return render(request, 'submit_leave.html', {'form': form})
 
@@ -196,13 +277,13 @@ def edit_leave(request, leave_id):
         return redirect('user_dashboard')
     
     if request.method == 'POST':
-        form = LeaveRequestForm(request.POST, instance=leave_request)
+        form = LeaveRequestForm(request.POST, instance=leave_request, user=request.user)
         if form.is_valid():
             form.save()
             messages.success(request, 'Leave request updated successfully!')
             return redirect('user_dashboard')
     else:
-        form = LeaveRequestForm(instance=leave_request)
+        form = LeaveRequestForm(instance=leave_request, user=request.user)
     
     return render(request, 'edit_leave.html', {'form': form, 'leave_request': leave_request})
 
@@ -227,47 +308,72 @@ def delete_leave(request, leave_id):
 @login_required
 def leave_history(request):
     """View leave history"""
+    # The admins' all-requests report may come from the reporting snapshot;
+    # employees always see their own requests live
+    db = DEFAULT_DB_ALIAS
     if request.user.role == 'admin':
-        leave_requests = LeaveRequest.objects.all()
+        db = reporting_db('history')
+        leave_requests = LeaveRequest.objects.using(db)
     else:
         leave_requests = LeaveRequest.objects.filter(user=request.user)
     
     # Calculate statistics
-    pending_count = leave_requests.filter(status='pending').count()
-    approved_count = leave_requests.filter(status='approved').count()
-    rejected_count = leave_requests.filter(status='rejected').count()
-    total_count = leave_requests.count()
+    stats = leave_requests.aggregate(
+        pending_count=Count('id', filter=Q(status='pending')),
+        approved_count=Count('id', filter=Q(status='approved')),
+        rejected_count=Count('id', filter=Q(status='rejected')),
+        total_count=Count('id'),
+    )
     
     context = {
-        'leave_requests': leave_requests,
-        'pending_count': pending_count,
-        'approved_count': approved_count,
-        'rejected_count': rejected_count,
-        'total_count': total_count,
+        'leave_requests': leave_requests.rows('reason', 'admin_comment', 'updated_on'),
+        'reporting_snapshot': snapshot_info(db),
+        **stats,
     }
     
     return render(request, 'leave_history.html', context)
 
+def requested_partial(request):
+    """Name of the page fragment asked for with ?partial= or X-Partial, if any"""
+    return request.GET.get('partial') or request.headers.get('X-Partial')
+
+# Views answering X-Partial with a fragment vary on it, so caches keep the
+# fragment and the full page apart
+@vary_on_headers('X-Partial')
 @login_required
 def update_leave_status(request, leave_id):
-    """Admin updates leave status"""
-    if request.user.role != 'admin':
-        messages.error(request, 'Only admins can update leave status')
+    """Admin or manager updates leave status"""
+    if not can_review(request.user):
+        messages.error(request, 'Only admins and managers can update leave status')
         return redirect('user_dashboard')
     
-    leave_request = get_object_or_404(LeaveRequest, id=leave_id)
+    # Requests outside a manager's reporting subtree are not found
+    leave_request = get_object_or_404(scope_requests(LeaveRequest.objects.all(), request.user), id=leave_id)
+    partial = requested_partial(request)
     
     if request.method == 'POST':
         form = LeaveApprovalForm(request.POST, instance=leave_request)
         if form.is_valid():
             form.save()
+            if partial == 'row':
+                # Just the updated tracking table row, swapped in place by the page
+                context = {'leave_requests': LeaveRequest.objects.filter(id=leave_request.id).rows(), 'rows_only': True}
+                return HttpResponse(render_list('admin/partials/tracking_results.html', context, request))
+            if partial:
+                return HttpResponse(status=204)
             messages.success(request, f'Leave request {leave_request.status}!')
-            return redirect('admin_dashboard')
+            next_url = request.POST.get('next')
+            if next_url and url_has_allowed_host_and_scheme(next_url, {request.get_host()}, request.is_secure()):
+                return redirect(next_url)
+            return redirect('admin_home' if request.user.role == 'admin' else 'admin_requests')
+        if partial:
+            return HttpResponse(status=400)
     else:
         form = LeaveApprovalForm(instance=leave_request)
     
     return render(request, 'admin_dashboard.html', {'form': form, 'leave_request': leave_request})
 
+@throttle('forgot_password', 'forgot_password.html', 'email')
 def forgot_password(request):
     """Forgot password view"""
     if request.method == 'POST':
@@ -349,14 +455,15 @@ def admin_home(request):
         print(f"DEBUG: Redirecting to user dashboard because role is '{request.user.role}', not 'admin'")
         return redirect('user_dashboard')
     
-    # Get statistics
-    total_users = CustomUser.objects.filter(role='user').count()
-    total_requests = LeaveRequest.objects.count()
-    pending_count = LeaveRequest.objects.filter(status='pending').count()
-    approved_count = LeaveRequest.objects.filter(status='approved').count()
+    # Get statistics, from the reporting snapshot when one is configured and fresh
+    db = reporting_db('home')
+    total_users = employees(CustomUser.objects.using(db)).count()
+    total_requests = LeaveRequest.objects.using(db).count()
+    pending_count = LeaveRequest.objects.using(db).filter(status='pending').count()
+    approved_count = LeaveRequest.objects.using(db).filter(status='approved').count()
     
     # Get recent requests (last 5)
-    recent_requests = LeaveRequest.objects.all().order_by('-submitted_on')[:5]
+    recent_requests = LeaveRequest.objects.using(db).order_by('-submitted_on')[:5]
     
     context = {
         'total_users': total_users,
@@ -364,22 +471,24 @@ def admin_home(request):
         'pending_count': pending_count,
         'approved_count': approved_count,
         'recent_requests': recent_requests,
+        'reporting_snapshot': snapshot_info(db),
     }
     
     print(f"DEBUG: Rendering admin home with context: {context}")
     return render(request, 'admin/home.html', context)
 
+@vary_on_headers('X-Partial')
 @login_required
 def admin_tracking(request):
     """Admin tracking page"""
     print(f"DEBUG TRACKING: User: {request.user}, Role: {getattr(request.user, 'role', 'NO ROLE')}")
     
-    if request.user.role != 'admin':
+    if not can_review(request.user):
         print(f"DEBUG TRACKING: Redirecting because role is '{request.user.role}'")
         return redirect('user_dashboard')
     
-    # Get all leave requests
-    leave_requests = LeaveRequest.objects.all().order_by('-submitted_on')
+    # Get all leave requests (a manager's reporting subtree only)
+    leave_requests = scope_requests(LeaveRequest.objects.all(), request.user).order_by('-submitted_on')
     
     # Apply filters
     search = request.GET.get('search')
@@ -403,28 +512,52 @@ def admin_tracking(request):
     if date_to:
         leave_requests = leave_requests.filter(end_date__lte=date_to)
     
-    # Calculate statistics
-    total_requests = leave_requests.count()
-    pending_requests = leave_requests.filter(status='pending').count()
-    approved_requests = leave_requests.filter(status='approved').count()
-    rejected_requests = leave_requests.filter(status='rejected').count()
+    # Length filters and sorting use the indexed days_count column
+    min_days = request.GET.get('min_days')
+    max_days = request.GET.get('max_days')
+    if min_days and min_days.isdigit():
+        leave_requests = leave_requests.filter(days_count__gte=int(min_days))
+    if max_days and max_days.isdigit():
+        leave_requests = leave_requests.filter(days_count__lte=int(max_days))
+    
+    sort = request.GET.get('sort')
+    if sort == 'longest':
+        leave_requests = leave_requests.order_by('-days_count', '-submitted_on')
+    elif sort == 'shortest':
+        leave_requests = leave_requests.order_by('days_count', '-submitted_on')
+    
+    # The rows fragment skips the stats aggregate
+    partial = requested_partial(request)
+    if partial == 'rows':
+        return HttpResponse(render_list('admin/partials/tracking_results.html',
+                                        {'leave_requests': leave_requests.rows()}, request))
     
-    # This month requests
+    # Calculate statistics
     now = timezone.now()
     this_month_start = now.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
-    this_month_requests = leave_requests.filter(submitted_on__gte=this_month_start).count()
+    stats = leave_requests.aggregate(
+        total_requests=Count('id'),
+        pending_requests=Count('id', filter=Q(status='pending')),
+        approved_requests=Count('id', filter=Q(status='approved')),
+        rejected_requests=Count('id', filter=Q(status='rejected')),
+        this_month_requests=Count('id', filter=Q(submitted_on__gte=this_month_start)),
+        approved_days=Sum('days_count', filter=Q(status='approved')),
+    )
+    # Fragment requests only render the blocks they swap in: the stats after
+    # an in-place approval, stats and rows together after a filter change
+    if partial == 'stats':
+        return render(request, 'admin/partials/tracking_stats.html', stats)
+    if partial == 'results':
+        return render(request, 'admin/partials/tracking_refresh.html', {'leave_requests': leave_requests.rows(), **stats})
     
     context = {
-        'leave_requests': leave_requests,
-        'total_requests': total_requests,
-        'pending_requests': pending_requests,
-        'approved_requests': approved_requests,
-        'rejected_requests': rejected_requests,
-        'this_month_requests': this_month_requests,
+        'leave_requests': leave_requests.rows(),
+        **stats,
     }
     
     return render(request, 'admin/tracking.html', context)
 
+@vary_on_headers('X-Partial')
 @login_required
 def admin_users(request):
     """Admin users management page"""
@@ -445,22 +578,22 @@ def admin_users(request):
             Q(last_name__icontains=search)
         )
     
-    # Add leave statistics for each user
-    users_with_stats = []
-    for user in users:
-        if user.role == 'user':
-            total_requests = LeaveRequest.objects.filter(user=user).count()
-            pending_requests = LeaveRequest.objects.filter(user=user, status='pending').count()
-            approved_requests = LeaveRequest.objects.filter(user=user, status='approved').count()
-            user.total_requests = total_requests
-            user.pending_requests = pending_requests
-            user.approved_requests = approved_requests
-        users_with_stats.append(user)
+    # Add leave statistics for each user in the same query
+    users_with_stats = users.annotate(
+        total_requests=Count('leave_requests'),
+        pending_requests=Count('leave_requests', filter=Q(leave_requests__status='pending')),
+        approved_requests=Count('leave_requests', filter=Q(leave_requests__status='approved')),
+        days_taken=Sum('leave_requests__days_count', filter=Q(leave_requests__status='approved')),
+    )
+    
+    # The search box swaps in just the cards; the header stats do not depend on it
+    if requested_partial(request) == 'cards':
+        return HttpResponse(render_list('admin/partials/user_cards.html', {'users': users_with_stats}, request))
     
     # Calculate statistics
     total_users = CustomUser.objects.count()
     admin_count = CustomUser.objects.filter(role='admin').count()
-    user_count = CustomUser.objects.filter(role='user').count()
+    user_count = employees(CustomUser.objects.all()).count()
     
     # New users this month
     now = timezone.now()
@@ -475,4 +608,138 @@ def admin_users(request):
         'new_users_count': new_users_count,
     }
     
-    return render(request, 'admin/users.html', context)
\ No newline at end of file
+    return render(request, 'admin/users.html', context)
+
+@login_required
+def throttle_stats(request):
+    """Login/signup throttling counters, used for tuning LEAVE_THROTTLE_RATES"""
+    if request.user.role != 'admin':
+        return redirect('user_dashboard')
+    
+    return JsonResponse(get_store().stats())
+
+@login_required
+def user_lookup(request):
+    """Typeahead lookup for the admin users search box"""
+    if request.user.role != 'admin':
+        return JsonResponse({'error': 'forbidden'}, status=403)
+    
+    try:
+        limit = min(int(request.GET.get('limit', 10)), 20)
+    except ValueError:
+        limit = 10
+    
+    matches = user_index.lookup(request.GET.get('q', ''), limit=limit)
+    results = [
+        {
+            'id': user['id'],
+            'username': user['username'],
+            'name': f"{user['first_name']} {user['last_name']}".strip(),
+            'email': user['email'],
+            'department': user['department'] or '',
+        }
+        for user in matches
+    ]
+    return JsonResponse({'results': results})
+
+@login_required
+@require_GET
+def leave_changes(request):
+    """Changes feed of leave requests since an opaque cursor, for downstream mirrors"""
+    if request.user.role != 'admin':
+        return JsonResponse({'error': 'forbidden'}, status=403)
+    
+    try:
+        limit = max(1, min(int(request.GET.get('limit', 500)), 1000))
+    except ValueError:
+        limit = 500
+    
+    try:
+        page = changes_page(request.GET.get('cursor'), limit=limit)
+    except signing.BadSignature:
+        return JsonResponse({'error': 'invalid cursor'}, status=400)
+    except CursorExpired as exc:
+        return JsonResponse({'error': str(exc)}, status=410)
+    return JsonResponse(page)
+
+@require_GET
+def calendar_feed(request, token):
+    """iCalendar feed of approved leave; the signed token replaces a login"""
+    try:
+        kind, value = read_feed_token(token)
+    except signing.BadSignature:  # also expired, revoked or for a department the holder left
+        raise Http404('Unknown calendar feed')
+    
+    feed = get_feed(kind, value)
+    response = get_conditional_response(request, etag=feed['etag'], last_modified=feed['last_modified'])
+    if response is None:
+        response = HttpResponse(feed['body'], content_type='text/calendar; charset=utf-8')
+    response['ETag'] = feed['etag']
+    response['Last-Modified'] = http_date(feed['last_modified'])
+    response['Cache-Control'] = 'private, max-age=300'
+    return response
+
+@login_required
+def audit_log(request):
+    """Admin view of the audit trail"""
+    if request.user.role != 'admin':
+        return redirect('user_dashboard')
+    
+    # Write out anything still buffered in this process so the page is current
+    audit_buffer.flush()
+    
+    entries = AuditLogEntry.objects.all()
+    model_name = request.GET.get('model')
+    action = request.GET.get('action')
+    actor = request.GET.get('actor')
+    if model_name:
+        entries = entries.filter(model_name=model_name)
+    if action:
+        entries = entries.filter(action=action)
+    if actor:
+        entries = entries.filter(actor_username=actor)
+    
+    paginator = Paginator(entries, 50)
+    page = paginator.get_page(request.GET.get('page'))
+    
+    query = request.GET.copy()
+    query.pop('page', None)
+    
+    context = {
+        'page': page,
+        'query_string': query.urlencode(),
+        'action_choices': AuditLogEntry.ACTION_CHOICES,
+    }
+    return render(request, 'admin/audit.html', context)
+
+@login_required
+def profile_reports(request):
+    """List saved request profiles"""
+    if request.user.role != 'admin':
+        return redirect('user_dashboard')
+    
+    return render(request, 'admin/profiles.html', {'reports': list_reports()})
+
+@login_required
+def profile_report(request, report_id):
+    """One request profile: cProfile summary and SQL with timings"""
+    if request.user.role != 'admin':
+        return redirect('user_dashboard')
+    
+    report = load_report(report_id)
+    if report is None:
+        raise Http404('Profile report not found')
+    
+    slowest = sorted(report['queries'], key=lambda query: query['ms'], reverse=True)[:10]
+    return render(request, 'admin/profile_report.html', {'report': report, 'slowest_queries': slowest})
+
+@login_required
+def profile_report_download(request, report_id):
+    """Download the raw .prof file for snakeviz/pstats"""
+    if request.user.role != 'admin':
+        return redirect('user_dashboard')
+    
+    path = report_file(report_id)
+    if path is None:
+        raise Http404('Profile report not found')
+    return FileResponse(open(path, 'rb'), as_attachment=True, filename=path.name)
\ No newline at end of file
@@ -0,0 +1,85 @@
+# khora/warmup.py
+import logging
+import time
+from pathlib import Path
+
+from django.apps import apps
+from django.db import DatabaseError
+from django.template.loader import get_template
+from django.urls import NoReverseMatch, get_resolver, reverse
+
+from .policies import compiled_policies
+from .search import user_index
+from .templating import jinja2_enabled, jinja2_engine
+
+logger = logging.getLogger(__name__)
+
+
+def template_names(folder='templates'):
+    root = Path(apps.get_app_config('tracking').path) / folder
+    return sorted(path.relative_to(root).as_posix() for path in root.rglob('*.html'))
+
+
+def warm_templates():
+    # Django wraps the app directories loader in the cached loader, so each
+    # compiled template stays in memory for the life of the worker.
+    names = template_names()
+    for name in names:
+        get_template(name)
+    count = len(names)
+    # The Jinja2 environment keeps its own cache of compiled list templates
+    if jinja2_enabled():
+        names = template_names('jinja2')
+        for name in names:
+            jinja2_engine().get_template(name)
+        count += len(names)
+    return count
+
+
+def warm_urls():
+    resolver = get_resolver()
+    resolver.reverse_dict  # builds the reverse lookup tables
+    resolved = 0
+    for name in [key for key in resolver.reverse_dict if isinstance(key, str)]:
+        try:
+            reverse(name)
+            resolved += 1
+        except NoReverseMatch:
+            # Patterns with arguments are already compiled into reverse_dict
+            pass
+    return resolved
+
+
+def warm_caches():
+    try:
+        return user_index.warm()
+    except DatabaseError:
+        logger.warning('Skipping cache warmup, database is not ready')
+        return 0
+
+
+def warm_policies():
+    # Compiles the active leave policies so the first submission skips it
+    try:
+        return len(compiled_policies.get())
+    except DatabaseError:
+        logger.warning('Skipping policy warmup, database is not ready')
+        return 0
+
+
+STEPS = (
+    ('templates', warm_templates),
+    ('urls', warm_urls),
+    ('caches', warm_caches),
+    ('policies', warm_policies),
+)
+
+
+def run_warmup():
+    """Run every warmup step; returns [(step, count, seconds)]"""
+    timings = []
+    for step, func in STEPS:
+        started = time.perf_counter()
+        count = func()
+        timings.append((step, count, time.perf_counter() - started))
+    return timings